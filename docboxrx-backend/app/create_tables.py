@@ -1,19 +1,42 @@
 import os
+import sys
 import asyncio
-import asyncpg
 from dotenv import load_dotenv
 from pathlib import Path
 
+# Runnable as `python app/create_tables.py` as well as `python -m app.create_tables`
+backend_dir = str(Path(__file__).resolve().parent.parent)
+if backend_dir not in sys.path:
+    sys.path.insert(0, backend_dir)
+
 env_path = Path(__file__).resolve().parent.parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# app.database refuses to import without DATABASE_URL; run_migration reports that case
+if DATABASE_URL:
+    from app.database import get_pg_pool, close_pg_pool
+
 MIGRATION_SQL = """
 CREATE EXTENSION IF NOT EXISTS \"uuid-ossp\";
 
+-- Time-ordered UUIDs append to the right edge of the PK btree instead of
+-- splitting random pages. Pure SQL so no extension is required.
+CREATE OR REPLACE FUNCTION uuid_generate_v7() RETURNS uuid AS $$
+    SELECT encode(
+        set_bit(
+            set_bit(
+                overlay(uuid_send(gen_random_uuid())
+                        placing substring(int8send(floor(extract(epoch FROM clock_timestamp()) * 1000)::bigint) FROM 3)
+                        FROM 1 FOR 6),
+                52, 1),
+            53, 1),
+        'hex')::uuid
+$$ LANGUAGE sql VOLATILE;
+
 CREATE TABLE IF NOT EXISTS message_state_vectors (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v7(),
     nylas_message_id TEXT UNIQUE NOT NULL,
     grant_id TEXT NOT NULL,
 
@@ -25,19 +48,23 @@ CREATE TABLE IF NOT EXISTS message_state_vectors (
     current_owner_role TEXT,
     deadline_at TIMESTAMP,
 
-    lifecycle_state TEXT DEFAULT 'NEW',
+    lifecycle_state VARCHAR(16) DEFAULT 'NEW'
+        CHECK (lifecycle_state IN ('NEW', 'ASSIGNED', 'ESCALATED', 'RESOLVED', 'ARCHIVED')),
     is_overdue BOOLEAN DEFAULT FALSE,
 
     created_at TIMESTAMP DEFAULT NOW(),
     updated_at TIMESTAMP DEFAULT NOW()
 );
 
-CREATE INDEX IF NOT EXISTS idx_vectors_lifecycle ON message_state_vectors(lifecycle_state);
-CREATE INDEX IF NOT EXISTS idx_vectors_risk ON message_state_vectors(risk_score DESC);
-CREATE INDEX IF NOT EXISTS idx_vectors_deadline ON message_state_vectors(deadline_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_vectors_lifecycle ON message_state_vectors(lifecycle_state);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_vectors_risk ON message_state_vectors(risk_score DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_vectors_deadline ON message_state_vectors(deadline_at);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_vectors_active ON message_state_vectors(deadline_at) WHERE lifecycle_state IN ('NEW', 'ASSIGNED');
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_vectors_context_gin ON message_state_vectors USING GIN (context_blob jsonb_path_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_vectors_created_brin ON message_state_vectors USING BRIN (created_at) WITH (pages_per_range = 64);
 
 CREATE TABLE IF NOT EXISTS message_events (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v7(),
     vector_id UUID REFERENCES message_state_vectors(id) ON DELETE CASCADE,
     event_type TEXT NOT NULL,
     description TEXT,
@@ -46,26 +73,77 @@ CREATE TABLE IF NOT EXISTS message_events (
 """
 
 
+def split_statements(sql: str) -> list[str]:
+    """Split a DDL blob into individual statements, dropping `--` comment lines."""
+    statements = []
+    for chunk in sql.split(";\n"):
+        stmt = "\n".join(line for line in chunk.splitlines() if not line.lstrip().startswith("--")).strip()
+        if stmt:
+            statements.append(stmt)
+    return statements
+
+
+def plan_stages(statements: list[str]) -> tuple[list[str], list[list[str]]]:
+    """Split statements into a transactional setup script and index builds.
+
+    The setup script (extensions and functions, then tables in order) is sent
+    as one multi-statement message. Indexes are built CONCURRENTLY, which
+    cannot run inside a transaction and allows only one build per table at a
+    time, so they are grouped per table; the groups can run in parallel.
+    """
+    setup, tables, indexes = [], [], {}
+    for stmt in statements:
+        upper = stmt.upper()
+        if upper.startswith(("CREATE EXTENSION", "CREATE OR REPLACE FUNCTION")):
+            setup.append(stmt)
+        elif upper.startswith("CREATE INDEX"):
+            table = upper.split(" ON ", 1)[1].split()[0].split("(")[0]
+            indexes.setdefault(table, []).append(stmt)
+        else:
+            tables.append(stmt)
+    return setup + tables, list(indexes.values())
+
+
 async def run_migration() -> None:
     if not DATABASE_URL:
         print(f"ERROR: DATABASE_URL not found. Checked path: {env_path}")
         return
 
     print("Connecting to Database...")
-    url = DATABASE_URL.replace("postgres://", "postgresql://")
 
     try:
-        conn = await asyncpg.connect(url)
+        pool = await get_pg_pool()
         print("Connected. Running Migration...")
 
-        await conn.execute(MIGRATION_SQL)
+        setup, index_groups = plan_stages(split_statements(MIGRATION_SQL))
+
+        # One round-trip: an argument-less execute uses the simple query
+        # protocol, which carries the whole script in a single message.
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute(";\n".join(setup))
+
+        # Outside any transaction: CONCURRENTLY builds don't block writers
+        async def run(group: list[str]) -> None:
+            async with pool.acquire() as conn:
+                for stmt in group:
+                    await conn.execute(stmt)
+
+        await asyncio.gather(*[run(group) for group in index_groups])
 
         print("Migration Complete! Tables 'message_state_vectors' and 'message_events' created.")
-        await conn.close()
 
     except Exception as e:
         print(f"Migration Failed: {e}")
 
 
+async def _main() -> None:
+    try:
+        await run_migration()
+    finally:
+        if DATABASE_URL:
+            await close_pg_pool()
+
+
 if __name__ == "__main__":
-    asyncio.run(run_migration())
+    asyncio.run(_main())
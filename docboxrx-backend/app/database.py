@@ -1,12 +1,19 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy import Column, String, DateTime, Float, Boolean, Text, Integer, ForeignKey, JSON
+from sqlalchemy import Column, String, DateTime, Enum, Float, Boolean, Text, Integer, ForeignKey, JSON, Index, Computed, bindparam, insert, lambda_stmt, literal_column, select
 from sqlalchemy.orm import relationship
-from datetime import datetime
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.schema import CreateTable, CreateIndex
+from sqlalchemy.sql import func
+from sqlalchemy.sql.functions import FunctionElement
+from sqlalchemy.ext.compiler import compiles
+import functools
+import json
 import os
+import re
 from dotenv import load_dotenv
 from pathlib import Path
-from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import asyncpg
 
 # Database URL - use environment variables
 env_path = Path(__file__).resolve().parent.parent / ".env"
@@ -16,32 +23,146 @@ DATABASE_URL = os.environ.get("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is required")
 
-# Convert postgres:// to postgresql+asyncpg:// for async support
-if DATABASE_URL.startswith("postgres://"):
-    DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql+asyncpg://", 1)
-elif DATABASE_URL.startswith("postgresql://"):
-    DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
-
-connect_args = {}
-if DATABASE_URL.startswith("postgresql+asyncpg://"):
-    parts = urlsplit(DATABASE_URL)
-    query = dict(parse_qsl(parts.query, keep_blank_values=True))
-    sslmode = query.pop("sslmode", None)
-    if sslmode and sslmode.lower() == "require":
-        connect_args["ssl"] = True
-    DATABASE_URL = urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), parts.fragment))
+_SSLMODE_RE = re.compile(r"([?&])sslmode=([^&]*)&?")
+
+
+@functools.lru_cache(maxsize=4)
+def _prepare_url(raw: str) -> tuple[str, dict]:
+    """Return the async driver URL and asyncpg connect_args for a raw DATABASE_URL."""
+    # Convert postgres:// to postgresql+asyncpg:// for async support
+    if raw.startswith("postgres://"):
+        url = raw.replace("postgres://", "postgresql+asyncpg://", 1)
+    elif raw.startswith("postgresql://"):
+        url = raw.replace("postgresql://", "postgresql+asyncpg://", 1)
+    else:
+        url = raw
+
+    args = {}
+    if url.startswith("postgresql+asyncpg://"):
+        # asyncpg does not understand libpq's sslmode query parameter
+        match = _SSLMODE_RE.search(url)
+        if match:
+            if match.group(2).lower() == "require":
+                args["ssl"] = True
+            url = _SSLMODE_RE.sub(r"\1", url, count=1).rstrip("?&")
+        # Keep parsed/planned statements on both the asyncpg and SQLAlchemy side;
+        # dead connections are detected by TCP keepalives rather than a ping query
+        args.update({
+            "statement_cache_size": 1024,
+            "prepared_statement_cache_size": 256,
+            "server_settings": {
+                "jit": "off",
+                "application_name": "docbox",
+                "tcp_keepalives_idle": "30",
+                "idle_in_transaction_session_timeout": "30s",
+            },
+        })
+    return url, args
+
+
+DATABASE_URL, connect_args = _prepare_url(DATABASE_URL)
+
+# Plain libpq-style URL for raw asyncpg callers (migrations, bulk loads)
+RAW_DATABASE_URL = DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
 
 # For SQLite, we need aiosqlite
 if DATABASE_URL.startswith("sqlite"):
     engine = create_async_engine(DATABASE_URL, echo=False)
 else:
-    engine = create_async_engine(DATABASE_URL, echo=False, pool_pre_ping=True, connect_args=connect_args)
+    engine = create_async_engine(
+        DATABASE_URL,
+        echo=False,
+        pool_pre_ping=False,
+        pool_size=20,
+        max_overflow=10,
+        pool_recycle=300,
+        insertmanyvalues_page_size=1000,
+        connect_args=connect_args,
+    )
 
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+# Shared asyncpg pool for raw SQL paths, created lazily on first use
+pg_pool: asyncpg.Pool | None = None
+
+
+async def get_pg_pool() -> asyncpg.Pool:
+    global pg_pool
+    if pg_pool is None:
+        pg_pool = await asyncpg.create_pool(RAW_DATABASE_URL, min_size=5, max_size=20, ssl=connect_args.get("ssl"))
+    return pg_pool
+
+
+async def close_pg_pool() -> None:
+    global pg_pool
+    if pg_pool is not None:
+        await pg_pool.close()
+        pg_pool = None
+
+VECTOR_COPY_COLUMNS = [
+    "nylas_message_id",
+    "grant_id",
+    "intent_label",
+    "risk_score",
+    "context_blob",
+    "summary",
+    "current_owner_role",
+    "deadline_at",
+    "lifecycle_state",
+]
+# Below this many rows the COPY setup costs more than a plain executemany
+COPY_MIN_ROWS = 32
+
+
+async def bulk_copy_vectors(rows: list[dict]) -> None:
+    """Bulk-load message_state_vectors rows via binary COPY."""
+    if not rows:
+        return
+    records = [
+        tuple(
+            json.dumps(row.get(col) or {}) if col == "context_blob" else row.get(col)
+            for col in VECTOR_COPY_COLUMNS
+        )
+        for row in rows
+    ]
+    pool = await get_pg_pool()
+    async with pool.acquire() as conn:
+        if len(records) < COPY_MIN_ROWS:
+            placeholders = ", ".join(f"${i}" for i in range(1, len(VECTOR_COPY_COLUMNS) + 1))
+            await conn.executemany(
+                f"INSERT INTO message_state_vectors ({', '.join(VECTOR_COPY_COLUMNS)}) VALUES ({placeholders})",
+                records,
+            )
+        else:
+            await conn.copy_records_to_table("message_state_vectors", records=records, columns=VECTOR_COPY_COLUMNS)
+
+class email_domain(FunctionElement):
+    """Lower-cased domain part of an email address, rendered per dialect."""
+    type = String()
+    inherit_cache = True
+
+@compiles(email_domain)
+def _email_domain_default(element, compiler, **kw):
+    return "lower(split_part(%s, '@', 2))" % compiler.process(element.clauses, **kw)
+
+@compiles(email_domain, "sqlite")
+def _email_domain_sqlite(element, compiler, **kw):
+    arg = compiler.process(element.clauses, **kw)
+    return "lower(substr(%s, instr(%s, '@') + 1))" % (arg, arg)
+
 class Base(DeclarativeBase):
     pass
 
+# Binary jsonb on Postgres (parsed once on write); plain JSON text elsewhere
+JsonB = JSON().with_variant(JSONB(), "postgresql")
+
+# Closed value sets stored as varchar(16) with a CHECK constraint, so the
+# planner gets accurate per-value stats and partial indexes can match them.
+ZONES = ("STAT", "TODAY", "THIS_WEEK", "LATER")
+MESSAGE_STATUSES = ("active", "done", "archived", "snoozed", "deleted")
+ZoneEnum = Enum(*ZONES, native_enum=False, create_constraint=True, length=16)
+MessageStatusEnum = Enum(*MESSAGE_STATUSES, native_enum=False, create_constraint=True, length=16)
+
 class User(Base):
     __tablename__ = "users"
     
@@ -50,7 +171,7 @@ class User(Base):
     name = Column(String, nullable=False)
     practice_name = Column(String, nullable=True)
     hashed_password = Column(String, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     messages = relationship("Message", back_populates="user", cascade="all, delete-orphan")
     sources = relationship("Source", back_populates="user", cascade="all, delete-orphan")
@@ -62,17 +183,17 @@ class Message(Base):
     id = Column(String, primary_key=True)
     user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
     sender = Column(String, nullable=False)
-    sender_domain = Column(String, nullable=False)
+    sender_domain = Column(String, Computed(email_domain(literal_column("sender")), persisted=True), index=True)
     subject = Column(String, nullable=False)
     snippet = Column(Text, nullable=True)
-    zone = Column(String, nullable=False)  # STAT, TODAY, THIS_WEEK, LATER
+    zone = Column(ZoneEnum, nullable=False)
     confidence = Column(Float, nullable=False)
     reason = Column(String, nullable=False)
     jone5_message = Column(String, nullable=False)
-    received_at = Column(DateTime, default=datetime.utcnow)
-    classified_at = Column(DateTime, default=datetime.utcnow)
+    received_at = Column(DateTime(timezone=True), server_default=func.now())
+    classified_at = Column(DateTime(timezone=True), server_default=func.now())
     corrected = Column(Boolean, default=False)
-    corrected_at = Column(DateTime, nullable=True)
+    corrected_at = Column(DateTime(timezone=True), nullable=True)
     source_id = Column(String, nullable=True)
     source_name = Column(String, nullable=True)
     
@@ -88,12 +209,12 @@ class Message(Base):
     raw_headers = Column(Text, nullable=True)  # Raw email headers
     
     # Metadata and attachments
-    email_metadata = Column(JSON, nullable=True)  # Additional metadata
-    attachments = Column(JSON, nullable=True)  # Attachment info
+    email_metadata = Column(JsonB, nullable=True)  # Additional metadata
+    attachments = Column(JsonB, nullable=True)  # Attachment info
     has_attachments = Column(Boolean, default=False)
     
     # Status and tracking
-    status = Column(String, default='active')  # active, archived, deleted
+    status = Column(MessageStatusEnum, default='active')
     read = Column(Boolean, default=False)
     starred = Column(Boolean, default=False)
     important = Column(Boolean, default=False)
@@ -115,7 +236,7 @@ class Source(Base):
     name = Column(String, nullable=False)
     inbound_token = Column(String, unique=True, nullable=False, index=True)
     inbound_address = Column(String, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
     email_count = Column(Integer, default=0)
     
     user = relationship("User", back_populates="sources")
@@ -125,10 +246,10 @@ class Correction(Base):
     
     id = Column(String, primary_key=True)
     user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
-    old_zone = Column(String, nullable=False)
-    new_zone = Column(String, nullable=False)
+    old_zone = Column(ZoneEnum, nullable=False)
+    new_zone = Column(ZoneEnum, nullable=False)
     sender = Column(String, nullable=False)
-    corrected_at = Column(DateTime, default=datetime.utcnow)
+    corrected_at = Column(DateTime(timezone=True), server_default=func.now())
     
     user = relationship("User", back_populates="corrections")
 
@@ -137,8 +258,8 @@ class RuleOverride(Base):
     
     id = Column(String, primary_key=True)
     sender_key = Column(String, unique=True, nullable=False, index=True)  # e.g., "sender:email@example.com"
-    zone = Column(String, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    zone = Column(ZoneEnum, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 # CloudMailin messages (for the public endpoint)
 class CloudMailinMessage(Base):
@@ -147,15 +268,15 @@ class CloudMailinMessage(Base):
     id = Column(String, primary_key=True)
     user_id = Column(String, default="cloudmailin-default-user")
     sender = Column(String, nullable=False)
-    sender_domain = Column(String, nullable=False)
+    sender_domain = Column(String, Computed(email_domain(literal_column("sender")), persisted=True), index=True)
     subject = Column(String, nullable=False)
     snippet = Column(Text, nullable=True)
-    zone = Column(String, nullable=False)
+    zone = Column(ZoneEnum, nullable=False)
     confidence = Column(Float, nullable=False)
     reason = Column(String, nullable=False)
     jone5_message = Column(String, nullable=False)
-    received_at = Column(DateTime, default=datetime.utcnow)
-    classified_at = Column(DateTime, default=datetime.utcnow)
+    received_at = Column(DateTime(timezone=True), server_default=func.now())
+    classified_at = Column(DateTime(timezone=True), server_default=func.now())
     corrected = Column(Boolean, default=False)
     source_id = Column(String, default="cloudmailin")
     source_name = Column(String, default="CloudMailin")
@@ -168,28 +289,126 @@ class Webhook(Base):
     grant_id = Column(String, nullable=True, index=True)  # Link to specific Nylas grant
     webhook_url = Column(String, nullable=False)  # External webhook URL
     webhook_secret = Column(String, nullable=True)  # Secret for verification
-    events = Column(JSON, nullable=True)  # List of events to subscribe to
+    events = Column(JsonB, nullable=True)  # List of events to subscribe to
     active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    last_triggered = Column(DateTime, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_triggered = Column(DateTime(timezone=True), nullable=True)
     trigger_count = Column(Integer, default=0)
     
     # Processing metadata
-    webhook_filters = Column(JSON, nullable=True)  # Event filters
-    webhook_headers = Column(JSON, nullable=True)  # Custom headers to send
+    webhook_filters = Column(JsonB, nullable=True)  # Event filters
+    webhook_headers = Column(JsonB, nullable=True)  # Custom headers to send
     
     user = relationship("User", back_populates="webhooks")
 
 # Add webhooks relationship to User
 User.webhooks = relationship("Webhook", back_populates="user", cascade="all, delete-orphan")
 
+# Inbox listing: WHERE user_id = ? AND status = 'active' ORDER BY received_at DESC,
+# served as an index-only scan on Postgres thanks to the INCLUDE columns
+Index(
+    "idx_messages_inbox",
+    Message.user_id,
+    Message.status,
+    Message.received_at.desc(),
+    postgresql_include=["subject", "sender", "zone", "confidence"],
+)
+# Thread view groups a user's messages by thread
+Index("idx_messages_thread", Message.user_id, Message.thread_id)
+
+# received_at grows with insert order, so a BRIN min/max summary serves
+# time-range scans at a fraction of a btree's size
+Index(
+    "idx_messages_received_brin",
+    Message.received_at,
+    postgresql_using="brin",
+    postgresql_with={"pages_per_range": 64},
+)
+
+# Hot statements built once at import; SQLAlchemy caches their compiled form,
+# so callers only supply parameters, e.g.
+#   await session.execute(SELECT_INBOX, {"uid": user_id, "lim": 50})
+INSERT_MESSAGE = insert(Message)
+SELECT_INBOX = lambda_stmt(
+    lambda: select(Message)
+    .where(Message.user_id == bindparam("uid"), Message.status == "active")
+    .order_by(Message.received_at.desc())
+    .limit(bindparam("lim"))
+)
+
+_ddl_blob: str | None = None
+
+def get_ddl_blob() -> str:
+    """Render every table and index as one idempotent DDL script (built once)."""
+    global _ddl_blob
+    if _ddl_blob is None:
+        statements = []
+        for table in Base.metadata.sorted_tables:
+            statements.append(str(CreateTable(table, if_not_exists=True).compile(engine)).strip())
+            for index in sorted(table.indexes, key=lambda i: i.name):
+                statements.append(str(CreateIndex(index, if_not_exists=True).compile(engine)).strip())
+        _ddl_blob = ";\n".join(statements) + ";"
+    return _ddl_blob
+
 async def init_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    # Ship the whole schema in a single round-trip instead of one per object
+    ddl = get_ddl_blob()
+    async with engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        if engine.dialect.name == "sqlite":
+            await raw.driver_connection.executescript(ddl)
+        else:
+            await raw.driver_connection.execute(ddl)
+
+async def bulk_insert(session: AsyncSession, model, rows: list[dict]) -> None:
+    """Insert many rows as batched multi-VALUES statements instead of one INSERT per object."""
+    if rows:
+        await session.execute(insert(model), rows)
+
+class LazySession:
+    """AsyncSession proxy that only creates the session on first use.
+
+    Attribute access, ``in``, iteration and ``async with`` are forwarded. Code that
+    needs a real AsyncSession (isinstance checks, typed helpers) should be given
+    ``.session``, which creates it.
+    """
+
+    def __init__(self, maker):
+        self._maker = maker
+        self._session = None
+
+    @property
+    def session(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self._maker()
+        return self._session
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    # Implicit dunder lookups skip __getattr__, so forward the ones AsyncSession defines
+    def __contains__(self, instance):
+        return instance in self.session
+
+    def __iter__(self):
+        return iter(self.session)
+
+    async def __aenter__(self):
+        await self.session.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.__aexit__(*exc_info)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
 
 async def get_db():
-    async with async_session() as session:
-        try:
-            yield session
-        finally:
-            await session.close()
+    # Routes that declare the dependency but never query skip the session entirely
+    session = LazySession(async_session)
+    try:
+        yield session
+    finally:
+        await session.close()
@@ -1,13 +1,23 @@
 """Database module for persistent storage using PostgreSQL or SQLite."""
+import asyncio
+import atexit
 import base64
 import json
 import os
 import uuid
-from datetime import datetime, timedelta
+import functools
 import hashlib
-from contextlib import contextmanager
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime, timezone
 from pathlib import Path
+import orjson
 from dotenv import load_dotenv
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 
 # Load environment variables from .env file
 env_path = Path(__file__).resolve().parent.parent / ".env"
@@ -20,126 +30,440 @@ if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is required - set in .env (local) or Fly secrets (prod)")
 
 USE_POSTGRES = DATABASE_URL.startswith("postgres")
+# Optional hot-standby for list/dashboard reads (db_read_cursor(replica=True)); the primary serves them when unset
+DATABASE_READ_URL = os.environ.get("DATABASE_READ_URL")
 
 if USE_POSTGRES:
     import psycopg
     from psycopg.rows import dict_row
-    from psycopg_pool import ConnectionPool
+    from psycopg_pool import AsyncConnectionPool, ConnectionPool
 else:
     import sqlite3
 
+if USE_POSTGRES:
+    # jsonb columns (provider_folders) are decoded by the driver; use the faster loader there too
+    from psycopg.types.json import set_json_loads
+    set_json_loads(orjson.loads)
+
 # Use /data directory on Fly.io for persistent storage, or local file for dev
 DB_PATH = os.environ.get("DATABASE_PATH", "/data/docboxrx.db" if os.path.exists("/data") else "./docboxrx.db")
 
 # Global connection pool for Postgres to avoid repeated connection overhead
 _pg_pool = None
-_sqlite_conn = None
-_token_key = hashlib.sha256((os.environ.get("DOCBOX_ENCRYPTION_KEY") or os.environ.get("SECRET_KEY") or "docboxrx-default").encode("utf-8")).digest()
+# Separate pool against DATABASE_READ_URL for lag-tolerant list reads, so they don't queue behind writers
+_pg_read_pool = None
+# Guards lazy pool creation so concurrent first requests share one pool
+_pg_pool_lock = threading.Lock()
+# Upper bound per pool; size to the number of worker threads
+PG_POOL_MAX = int(os.environ.get("PG_POOL_MAX", "10"))
+# Async pool for request handlers, so concurrent queries overlap network latency
+_async_pg_pool = None
+# One SQLite connection per thread, each with its own page cache
+_sqlite_local = threading.local()
+# Cursor of the transaction() block open on this thread, if any
+_tx_local = threading.local()
+_token_secret = (os.environ.get("DOCBOX_ENCRYPTION_KEY") or os.environ.get("SECRET_KEY") or "docboxrx-default").encode("utf-8")
+# Legacy XOR key; only used to read tokens written before AES-GCM
+_token_key = hashlib.sha256(_token_secret).digest()
+_token_aead = AESGCM(HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=b"docboxrx-token-aead").derive(_token_secret))
+# Marks AES-GCM ciphertexts; anything without it is a legacy XOR value
+_TOKEN_PREFIX = "v1:"
+_TOKEN_NONCE_BYTES = 12
+
+
+# Key pre-tiled once so any value up to 4 KiB just slices it
+_TOKEN_KEY_TILED_BYTES = 4096
+_token_key_tiled = _token_key * (_TOKEN_KEY_TILED_BYTES // len(_token_key))
 
 
 def _xor_cipher(value: bytes) -> bytes:
     """Apply a simple XOR cipher using the derived token key."""
-    return bytes(b ^ _token_key[i % len(_token_key)] for i, b in enumerate(value))
+    n = len(value)
+    if n > _TOKEN_KEY_TILED_BYTES:
+        key_bytes = (_token_key * (n // len(_token_key) + 1))[:n]
+    else:
+        key_bytes = _token_key_tiled[:n]
+    # One bignum XOR runs in C over machine words instead of per byte
+    return (int.from_bytes(value, "big") ^ int.from_bytes(key_bytes, "big")).to_bytes(n, "big")
 
 
 def encrypt_token(value: str | None) -> str | None:
-    """Encrypt a sensitive token using a reversible XOR + base64 scheme."""
+    """Encrypt a sensitive token with AES-GCM; returns a prefixed base64 string."""
     if value is None:
         return None
-    encrypted = _xor_cipher(value.encode("utf-8"))
-    return base64.urlsafe_b64encode(encrypted).decode("utf-8")
+    nonce = os.urandom(_TOKEN_NONCE_BYTES)
+    encrypted = _token_aead.encrypt(nonce, value.encode("utf-8"), None)
+    return _TOKEN_PREFIX + base64.urlsafe_b64encode(nonce + encrypted).decode("utf-8")
 
 
-def decrypt_token(value: str | None) -> str | None:
-    """Decrypt a sensitive token previously stored with encrypt_token."""
-    if not value:
-        return None
+# The key is fixed at import, so cached ciphertext -> plaintext pairs never go stale.
+# Sized for two tokens per grant so a full credentials sweep doesn't evict itself.
+@functools.lru_cache(maxsize=4096)
+def _decrypt_cached(value: str) -> str | None:
     try:
+        if value.startswith(_TOKEN_PREFIX):
+            raw = base64.urlsafe_b64decode(value[len(_TOKEN_PREFIX):].encode("utf-8"))
+            nonce, encrypted = raw[:_TOKEN_NONCE_BYTES], raw[_TOKEN_NONCE_BYTES:]
+            return _token_aead.decrypt(nonce, encrypted, None).decode("utf-8")
         raw = base64.urlsafe_b64decode(value.encode("utf-8"))
-        decrypted = _xor_cipher(raw)
-        return decrypted.decode("utf-8")
+        return _xor_cipher(raw).decode("utf-8")
     except Exception:
         return None
 
 
+def decrypt_token(value: str | None) -> str | None:
+    """Decrypt a token stored by encrypt_token, including legacy XOR values."""
+    if not value:
+        return None
+    return _decrypt_cached(value)
+
+
+# Below this many tokens thread hand-off costs more than the decrypts themselves
+_PARALLEL_DECRYPT_MIN = 512
+_decrypt_executor = None
+
+
+def _decrypt_chunk(values: list) -> list:
+    return [decrypt_token(value) for value in values]
+
+
+def decrypt_tokens(values: list) -> list:
+    """Decrypt many tokens in order; large batches are split across worker threads."""
+    global _decrypt_executor
+    workers = os.cpu_count() or 1
+    if len(values) < _PARALLEL_DECRYPT_MIN or workers == 1:
+        return _decrypt_chunk(values)
+    if _decrypt_executor is None:
+        _decrypt_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="token-decrypt")
+    # One contiguous slice per worker keeps per-task overhead to a handful of futures
+    size = -(-len(values) // workers)
+    chunks = [values[i:i + size] for i in range(0, len(values), size)]
+    return [token for chunk in _decrypt_executor.map(_decrypt_chunk, chunks) for token in chunk]
+
+
 @contextmanager
 def get_db():
-    """Context manager for database connections."""
-    conn = None
-    try:
-        conn = get_connection()
-        yield conn
-    finally:
-        if conn:
-            release_connection(conn)
-
-
-def _sanitize_grant_row(row: dict) -> dict:
-    """Return a grant row without sensitive token fields."""
-    allowed_keys = (
-        "id",
-        "user_id",
-        "grant_id",
-        "email",
-        "provider",
-        "created_at",
-        "last_sync_at",
-        "expires_at",
-        "token_type",
-        "scope",
-    )
-    return {key: row.get(key) for key in allowed_keys if key in row}
-
-
-def _normalize_provider_fields(row: dict) -> dict:
-    folders_raw = row.get('provider_folders')
-    if folders_raw:
-        if isinstance(folders_raw, str):
-            try:
-                row['provider_folders'] = json.loads(folders_raw)
-            except json.JSONDecodeError:
-                row['provider_folders'] = []
-        elif isinstance(folders_raw, (list, tuple)):
-            row['provider_folders'] = list(folders_raw)
+    """Context manager for a pooled connection; returned to the pool on exit."""
+    if USE_POSTGRES:
+        with _get_pg_pool().connection() as conn:
+            yield conn
     else:
+        yield get_connection()
+
+
+# psycopg's dict_row already builds a fresh dict per row; only sqlite3.Row needs converting
+_row_dict = (lambda row: row) if USE_POSTGRES else dict
+
+
+# Non-secret grant columns: every grant view selects or returns exactly these, never the tokens
+GRANT_VIEW_COLS = "id, user_id, grant_id, email, provider, created_at, last_sync_at, expires_at, token_type, scope"
+GRANT_CREDENTIAL_COLS = "grant_id, user_id, email, provider, access_token, refresh_token, expires_at, token_type, scope"
+
+
+def _normalize_provider_fields(row: dict, cache: dict | None = None) -> dict:
+    """Give provider_folders as a list and flags as bools; pass a shared cache when normalizing many rows."""
+    folders_raw = row.get('provider_folders')
+    if not folders_raw:
         row['provider_folders'] = []
+    elif isinstance(folders_raw, str):
+        # SQLite keeps folders as JSON text; Postgres jsonb already arrives as a fresh list
+        folders = cache.get(folders_raw) if cache is not None else None
+        if folders is None:
+            try:
+                folders = orjson.loads(folders_raw)
+            except ValueError:
+                folders = []
+            if not isinstance(folders, list):
+                folders = []
+            if cache is not None:
+                cache[folders_raw] = folders
+        # Copy so rows sharing a folder set don't alias each other
+        row['provider_folders'] = list(folders)
+    if not USE_POSTGRES:
+        for flag in ('provider_unread', 'llm_fallback'):
+            if row.get(flag) is not None:
+                row[flag] = bool(row[flag])
     return row
 
 
+SQLITE_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "temp_store=MEMORY",
+    "cache_size=-64000",
+    "mmap_size=268435456",
+)
+# Journal mode is per-database, so read handles only need the cache settings
+SQLITE_READ_PRAGMAS = (
+    "temp_store=MEMORY",
+    "cache_size=-64000",
+    "mmap_size=268435456",
+    "query_only=ON",
+)
+
+
+def _get_pg_pool():
+    """Return the shared Postgres pool, creating it on first use."""
+    global _pg_pool
+    if _pg_pool is None:
+        with _pg_pool_lock:
+            if _pg_pool is None:
+                # Keep a few warm connections; statements run 3+ times get server-side prepared.
+                # Connections are checked on checkout so ones the server dropped while idle get replaced.
+                _pg_pool = ConnectionPool(
+                    DATABASE_URL,
+                    min_size=4,
+                    max_size=PG_POOL_MAX,
+                    max_idle=300,
+                    timeout=10,
+                    kwargs={"prepare_threshold": 3, "row_factory": dict_row},
+                    check=ConnectionPool.check_connection,
+                )
+    return _pg_pool
+
+
+def _get_pg_read_pool():
+    """Return the read-only Postgres pool, or the primary pool when no replica is configured."""
+    global _pg_read_pool
+    if not DATABASE_READ_URL:
+        return _get_pg_pool()
+    if _pg_read_pool is None:
+        with _pg_pool_lock:
+            if _pg_read_pool is None:
+                _pg_read_pool = ConnectionPool(
+                    DATABASE_READ_URL,
+                    min_size=4,
+                    max_size=PG_POOL_MAX * 2,
+                    max_idle=300,
+                    timeout=10,
+                    kwargs={"prepare_threshold": 3, "row_factory": dict_row, "options": "-c default_transaction_read_only=on"},
+                    check=ConnectionPool.check_connection,
+                )
+    return _pg_read_pool
+
+
+def open_pools() -> None:
+    """Open the Postgres pools and wait for their warm connections (call at startup)."""
+    if USE_POSTGRES:
+        for pool in {_get_pg_pool(), _get_pg_read_pool()}:
+            pool.wait()
+
+
+def close_pools() -> None:
+    """Close the sync Postgres pools if they were opened."""
+    global _pg_pool, _pg_read_pool
+    with _pg_pool_lock:
+        for pool in {pool for pool in (_pg_pool, _pg_read_pool) if pool is not None}:
+            pool.close()
+        _pg_pool = _pg_read_pool = None
+
+
+async def _get_async_pg_pool():
+    """Return the shared async Postgres pool, opening it on first use."""
+    global _async_pg_pool
+    if _async_pg_pool is None:
+        pool = AsyncConnectionPool(
+            DATABASE_URL,
+            min_size=2,
+            max_size=20,
+            kwargs={"prepare_threshold": 3, "row_factory": dict_row},
+            open=False,
+        )
+        await pool.open()
+        _async_pg_pool = pool
+    return _async_pg_pool
+
+
+async def close_async_pool() -> None:
+    """Close the async Postgres pool if it was opened."""
+    global _async_pg_pool
+    if _async_pg_pool is not None:
+        await _async_pg_pool.close()
+        _async_pg_pool = None
+
+
 def get_connection():
     """Get a database connection."""
-    global _pg_pool, _sqlite_conn
-    
     if USE_POSTGRES:
-        if _pg_pool is None:
-            _pg_pool = ConnectionPool(DATABASE_URL, min_size=1, max_size=10)
-        return _pg_pool.getconn()
+        return _get_pg_pool().getconn()
     else:
-        if _sqlite_conn is None:
-            _sqlite_conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-            _sqlite_conn.row_factory = sqlite3.Row
-        return _sqlite_conn
+        conn = getattr(_sqlite_local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(DB_PATH, check_same_thread=False, timeout=5.0)
+            conn.row_factory = sqlite3.Row
+            # WAL lets readers run alongside the writer
+            for pragma in SQLITE_PRAGMAS:
+                conn.execute(f"PRAGMA {pragma}")
+            _sqlite_local.conn = conn
+        return conn
+
+
+def get_read_connection():
+    """Get a connection for reads; on SQLite a per-thread read-only handle."""
+    if USE_POSTGRES:
+        return get_connection()
+    conn = getattr(_sqlite_local, "read_conn", None)
+    if conn is None:
+        # WAL readers never wait on the writer, so hot lookups skip its lock entirely
+        conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True, check_same_thread=False, timeout=5.0)
+        conn.row_factory = sqlite3.Row
+        for pragma in SQLITE_READ_PRAGMAS:
+            conn.execute(f"PRAGMA {pragma}")
+        _sqlite_local.read_conn = conn
+    return conn
 
 
 def release_connection(conn):
     """Release a database connection."""
-    global _pg_pool, _sqlite_conn
-    
     if USE_POSTGRES:
-        _pg_pool.putconn(conn)
+        _get_pg_pool().putconn(conn)
     else:
         # SQLite doesn't need explicit connection release
         pass
 
 
+# Server-side UTC "now" for insert defaults, so no per-row clock call or string formatting in Python.
+# SQLite stores ISO-8601 text to match values written by callers.
+_SQL_UTC_NOW = "(NOW() AT TIME ZONE 'UTC')" if USE_POSTGRES else "strftime('%Y-%m-%dT%H:%M:%f', 'now')"
+
+
+if USE_POSTGRES:
+    @functools.lru_cache(maxsize=256)
+    def p(query: str) -> str:
+        """Rewrite ? placeholders to %s for psycopg; cached since queries are mostly literals."""
+        return query.replace('?', '%s')
+else:
+    def p(query: str) -> str:
+        """SQLite takes ? placeholders as-is."""
+        return query
+
+
+def _execute_prepared(cursor, query: str, params):
+    """Execute a hot query, preparing it server-side on first use (Postgres)."""
+    if USE_POSTGRES:
+        cursor.execute(query, params, prepare=True)
+    else:
+        cursor.execute(query, params)
+
+
+@contextmanager
+def db_read_cursor(replica: bool = False):
+    """Yield a cursor for read-only queries, from the primary pool or SQLite read handle.
+
+    Pass replica=True only for list/dashboard reads that can tolerate replication lag;
+    user, credential and read-your-own-write lookups must stay on the primary.
+    """
+    if getattr(_tx_local, "cursor", None) is not None:
+        # Reads inside transaction() must see its uncommitted writes
+        with db_cursor() as cursor:
+            yield cursor
+    elif USE_POSTGRES:
+        with (_get_pg_read_pool() if replica else _get_pg_pool()).connection() as conn:
+            with conn.cursor() as cursor:
+                yield cursor
+    else:
+        cursor = get_read_connection().cursor()
+        try:
+            yield cursor
+        finally:
+            # Resetting the statement ends the read snapshot so later reads see new commits
+            cursor.close()
+
+
+@contextmanager
+def db_cursor():
+    """Yield a cursor; commit on success, roll back on error, always release the connection."""
+    tx_cursor = getattr(_tx_local, "cursor", None)
+    if tx_cursor is not None:
+        # Inside transaction(): the enclosing block commits
+        yield tx_cursor
+        return
+    if USE_POSTGRES:
+        with _get_pg_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                yield cursor
+    else:
+        conn = get_connection()
+        try:
+            yield conn.cursor()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+@contextmanager
+def transaction():
+    """Run several helpers as one transaction: one commit (one fsync on SQLite), all or nothing."""
+    if getattr(_tx_local, "cursor", None) is not None:
+        # Nested blocks join the outer transaction
+        yield _tx_local.cursor
+        return
+    if USE_POSTGRES:
+        with _get_pg_pool().connection() as conn:
+            with conn.cursor() as cursor:
+                _tx_local.cursor = cursor
+                try:
+                    yield cursor
+                finally:
+                    _tx_local.cursor = None
+    else:
+        conn = get_connection()
+        # Take the write lock up front so the block can't fail midway on SQLITE_BUSY
+        conn.execute('BEGIN IMMEDIATE')
+        _tx_local.cursor = conn.cursor()
+        try:
+            yield _tx_local.cursor
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            _tx_local.cursor = None
+
+
+@asynccontextmanager
+async def adb_cursor():
+    """Async counterpart of db_cursor for Postgres; the pool commits on clean exit."""
+    pool = await _get_async_pg_pool()
+    async with pool.connection() as conn:
+        async with conn.cursor() as cursor:
+            yield cursor
+
+
+# Bump when init_db's DDL changes so existing databases re-run it
+SCHEMA_VERSION = 8
+# Arbitrary key for the advisory lock that serialises init_db across worker processes
+_INIT_DB_LOCK_KEY = 0x646F6362
+# Set once this process has confirmed the schema is current
+_schema_ready = False
+
+
 def init_db():
-    """Initialize database schema."""
-    conn = get_connection()
-    try:
+    """Initialize database schema; a no-op once it has succeeded in this process."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    with get_db() as conn:
         cursor = conn.cursor()
-        
+
+        if USE_POSTGRES:
+            # Held until commit/rollback, so concurrent workers wait and then see the new version
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', (_INIT_DB_LOCK_KEY,))
+
+        # Skip all DDL once this schema version has been applied
+        cursor.execute('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)')
+        cursor.execute('SELECT version FROM schema_version')
+        row = cursor.fetchone()
+        if row and row['version'] >= SCHEMA_VERSION:
+            conn.rollback()
+            _schema_ready = True
+            return
+
+        statements = []
+
         # Users table
-        cursor.execute('''
+        statements.append('''
             CREATE TABLE IF NOT EXISTS users (
                 id TEXT PRIMARY KEY,
                 email TEXT UNIQUE NOT NULL,
@@ -151,7 +475,7 @@ def init_db():
         ''')
         
         # Sources table (for CloudMailin and other sources)
-        cursor.execute('''
+        statements.append('''
             CREATE TABLE IF NOT EXISTS sources (
                 id TEXT PRIMARY KEY,
                 user_id TEXT NOT NULL,
@@ -164,8 +488,11 @@ def init_db():
             )
         ''')
         
+        # Postgres stores provider folder lists as jsonb, so psycopg decodes them natively
+        json_type = 'JSONB' if USE_POSTGRES else 'TEXT'
+
         # Messages table
-        cursor.execute('''
+        statements.append(f'''
             CREATE TABLE IF NOT EXISTS messages (
                 id TEXT PRIMARY KEY,
                 user_id TEXT NOT NULL,
@@ -189,6 +516,8 @@ def init_db():
                 provider_message_id TEXT,
                 thread_id TEXT,
                 provider TEXT,
+                provider_folders {json_type},
+                provider_unread BOOLEAN DEFAULT TRUE,
                 
                 -- Full email content
                 raw_body TEXT,
@@ -205,6 +534,9 @@ def init_db():
                 read_status BOOLEAN DEFAULT FALSE,
                 starred BOOLEAN DEFAULT FALSE,
                 important BOOLEAN DEFAULT FALSE,
+                snoozed_until TEXT,
+                needs_reply INTEGER DEFAULT 0,
+                replied_at TEXT,
                 
                 -- AI processing fields
                 summary TEXT,
@@ -218,7 +550,7 @@ def init_db():
         ''')
         
         # Corrections table
-        cursor.execute('''
+        statements.append('''
             CREATE TABLE IF NOT EXISTS corrections (
                 id TEXT PRIMARY KEY,
                 user_id TEXT NOT NULL,
@@ -231,7 +563,7 @@ def init_db():
         ''')
         
         # Rule overrides table
-        cursor.execute('''
+        statements.append('''
             CREATE TABLE IF NOT EXISTS rule_overrides (
                 id TEXT PRIMARY KEY,
                 sender_key TEXT UNIQUE NOT NULL,
@@ -241,7 +573,7 @@ def init_db():
         ''')
         
         # CloudMailin messages table
-        cursor.execute('''
+        statements.append('''
             CREATE TABLE IF NOT EXISTS cloudmailin_messages (
                 id TEXT PRIMARY KEY,
                 user_id TEXT DEFAULT 'cloudmailin-default-user',
@@ -262,7 +594,7 @@ def init_db():
         ''')
         
         # Nylas grants table (stores connected email accounts via Nylas)
-        cursor.execute('''
+        statements.append('''
             CREATE TABLE IF NOT EXISTS nylas_grants (
                 id TEXT PRIMARY KEY,
                 user_id TEXT NOT NULL,
@@ -281,42 +613,77 @@ def init_db():
             )
         ''')
         
+        grant_columns = ["access_token", "refresh_token", "expires_at", "token_type", "scope"]
+        # Message columns added after the table first shipped
+        message_columns = [
+            f"provider_folders {json_type}",
+            "provider_unread BOOLEAN DEFAULT TRUE",
+            "snoozed_until TEXT",
+            "needs_reply INTEGER DEFAULT 0",
+            "replied_at TEXT",
+        ]
         if USE_POSTGRES:
-            cursor.execute('ALTER TABLE nylas_grants ADD COLUMN IF NOT EXISTS access_token TEXT')
-            cursor.execute('ALTER TABLE nylas_grants ADD COLUMN IF NOT EXISTS refresh_token TEXT')
-            cursor.execute('ALTER TABLE nylas_grants ADD COLUMN IF NOT EXISTS expires_at TEXT')
-            cursor.execute('ALTER TABLE nylas_grants ADD COLUMN IF NOT EXISTS token_type TEXT')
-            cursor.execute('ALTER TABLE nylas_grants ADD COLUMN IF NOT EXISTS scope TEXT')
-        else:
-            for column in [
-                ("access_token", "TEXT"),
-                ("refresh_token", "TEXT"),
-                ("expires_at", "TEXT"),
-                ("token_type", "TEXT"),
-                ("scope", "TEXT"),
-            ]:
-                try:
-                    cursor.execute(f'ALTER TABLE nylas_grants ADD COLUMN {column[0]} {column[1]}')
-                except Exception:
-                    pass
-        
+            # One ALTER per table takes its ACCESS EXCLUSIVE lock once
+            statements.append('ALTER TABLE nylas_grants ' + ', '.join(f'ADD COLUMN IF NOT EXISTS {column} TEXT' for column in grant_columns))
+            statements.append('ALTER TABLE messages ' + ', '.join(f'ADD COLUMN IF NOT EXISTS {column_def}' for column_def in message_columns))
+            # Older databases created provider_folders as TEXT; convert it in place once
+            statements.append('''
+                DO $$
+                BEGIN
+                    IF EXISTS (
+                        SELECT 1 FROM information_schema.columns
+                        WHERE table_name = 'messages' AND column_name = 'provider_folders' AND data_type = 'text'
+                    ) THEN
+                        ALTER TABLE messages ALTER COLUMN provider_folders TYPE jsonb USING NULLIF(provider_folders, '')::jsonb;
+                    END IF;
+                END $$
+            ''')
+
         # Create indexes
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sources_user_id ON sources(user_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sources_inbound_token ON sources(inbound_token)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_nylas_grants_user_id ON nylas_grants(user_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_nylas_grants_grant_id ON nylas_grants(grant_id)')
-        
+        statements.append('CREATE INDEX IF NOT EXISTS idx_sources_user_id ON sources(user_id)')
+        statements.append('CREATE INDEX IF NOT EXISTS idx_sources_inbound_token ON sources(inbound_token)')
+        statements.append('CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)')
+        # Emails compare case-insensitively; also blocks duplicates differing only in case
+        statements.append('CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email_lower ON users(lower(email))')
+        statements.append('CREATE INDEX IF NOT EXISTS idx_nylas_grants_user_id ON nylas_grants(user_id)')
+        # create_nylas_grant upserts on grant_id. Databases holding duplicate grant_ids fail here;
+        # clean them up with migrations/002_dedupe_nylas_grants.sql
+        statements.append('DROP INDEX IF EXISTS idx_nylas_grants_grant_id')
+        statements.append('CREATE UNIQUE INDEX IF NOT EXISTS idx_nylas_grants_grant_id_unique ON nylas_grants(grant_id)')
+        # Inbox listings filter by user (and zone) and sort newest first
+        statements.append('CREATE INDEX IF NOT EXISTS idx_messages_user_recv ON messages(user_id, received_at DESC)')
+        statements.append('CREATE INDEX IF NOT EXISTS idx_messages_user_zone_recv ON messages(user_id, zone, received_at DESC)')
+        # Action Center urgent legs: only open messages, already in per-zone recency order
+        statements.append('''
+            CREATE INDEX IF NOT EXISTS idx_messages_open_zone_recv ON messages(user_id, zone, received_at DESC)
+            WHERE status IS NULL OR status = 'active'
+        ''')
+        statements.append('CREATE INDEX IF NOT EXISTS idx_cloudmailin_messages_recv ON cloudmailin_messages(received_at DESC)')
+
+        # Record the applied version
+        statements.append('DELETE FROM schema_version')
+        statements.append(f'INSERT INTO schema_version (version) VALUES ({SCHEMA_VERSION})')
+
+        if USE_POSTGRES:
+            # Without parameters psycopg sends the whole script in one round-trip
+            cursor.execute(";\n".join(statements))
+        else:
+            for stmt in statements:
+                cursor.execute(stmt)
+            # SQLite has no ADD COLUMN IF NOT EXISTS; add only what table_info lacks
+            for table, column_defs in (('nylas_grants', [f'{column} TEXT' for column in grant_columns]), ('messages', message_columns)):
+                existing = {row[1] for row in cursor.execute(f'PRAGMA table_info({table})').fetchall()}
+                for column_def in column_defs:
+                    if column_def.split()[0] not in existing:
+                        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column_def}')
+
         conn.commit()
-        
-    finally:
-        release_connection(conn)
+        _schema_ready = True
 
 
 def create_state_vector_tables():
     """Create state vector tables for AI processing."""
-    conn = get_connection()
-    try:
+    with get_db() as conn:
         cursor = conn.cursor()
         
         # Message state vectors table
@@ -331,7 +698,8 @@ def create_state_vector_tables():
                 summary TEXT,
                 current_owner_role TEXT,
                 deadline_at TIMESTAMP,
-                lifecycle_state TEXT DEFAULT 'NEW',
+                lifecycle_state VARCHAR(16) DEFAULT 'NEW'
+                    CHECK (lifecycle_state IN ('NEW', 'ASSIGNED', 'ESCALATED', 'RESOLVED', 'ARCHIVED')),
                 is_overdue BOOLEAN DEFAULT FALSE,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
@@ -354,257 +722,468 @@ def create_state_vector_tables():
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_vectors_lifecycle ON message_state_vectors(lifecycle_state)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_vectors_risk ON message_state_vectors(risk_score DESC)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_vectors_deadline ON message_state_vectors(deadline_at)')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_vectors_active ON message_state_vectors(deadline_at) WHERE lifecycle_state IN ('NEW', 'ASSIGNED')")
         
         conn.commit()
-        
-    finally:
-        release_connection(conn)
+
+
+# Hot lookups, rewritten for the driver once at import
+_Q_GET_USER_BY_EMAIL = p('SELECT * FROM users WHERE lower(email) = lower(?)')
+_Q_GET_USER_BY_ID = p('SELECT * FROM users WHERE id = ?')
+_Q_EMAIL_EXISTS = p('SELECT 1 FROM users WHERE lower(email) = lower(?) LIMIT 1')
+_Q_GET_SOURCE_BY_TOKEN = p('SELECT * FROM sources WHERE inbound_token = ?')
+_Q_GET_RULE_OVERRIDE = p('SELECT zone FROM rule_overrides WHERE sender_key = ?')
+# Looked up once per synced message and before every Nylas call
+_Q_GET_GRANT_BY_GRANT_ID = p(f'SELECT {GRANT_VIEW_COLS} FROM nylas_grants WHERE grant_id = ?')
+_Q_GET_GRANTS_BY_USER = p(f'SELECT {GRANT_VIEW_COLS} FROM nylas_grants WHERE user_id = ? ORDER BY created_at DESC')
+_Q_GET_GRANT_CREDENTIALS = p(
+    'SELECT user_id, email, provider, access_token, refresh_token, expires_at, token_type, scope FROM nylas_grants WHERE grant_id = ?'
+)
 
 
 # User operations
 def create_user(user_data: dict) -> dict:
-    conn = get_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute('''
+    with db_cursor() as cursor:
+        cursor.execute(p('''
             INSERT INTO users (id, email, name, practice_name, hashed_password)
             VALUES (?, ?, ?, ?, ?)
-        ''', (
+        '''), (
             user_data["id"],
             user_data["email"],
             user_data["name"],
             user_data.get("practice_name"),
             user_data["hashed_password"]
         ))
-        conn.commit()
-        return user_data
-    finally:
-        release_connection(conn)
+    forget_user(user_data["id"])
+    return user_data
+
+
+# Every authenticated request looks its user up by id; keep recent rows for a short TTL
+_USER_CACHE_TTL = 60.0
+_USER_CACHE_MAX = 10_000
+_user_cache: dict[str, tuple[float, dict]] = {}
+_user_cache_lock = threading.Lock()
+
+
+def _cached_user(user_id: str) -> dict | None:
+    entry = _user_cache.get(user_id)
+    if entry is not None and entry[0] > time.monotonic():
+        return dict(entry[1])
+    return None
+
+
+def _cache_user(user: dict) -> None:
+    with _user_cache_lock:
+        _user_cache.pop(user['id'], None)
+        if len(_user_cache) >= _USER_CACHE_MAX:
+            # Dicts keep insertion order, so the first key is the oldest entry
+            _user_cache.pop(next(iter(_user_cache)))
+        _user_cache[user['id']] = (time.monotonic() + _USER_CACHE_TTL, dict(user))
+
+
+def forget_user(user_id: str) -> None:
+    """Drop a cached user row; call after any write to that user."""
+    with _user_cache_lock:
+        _user_cache.pop(user_id, None)
 
 
 def get_user_by_email(email: str) -> dict | None:
-    conn = get_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM users WHERE email = ?', (email,))
+    with db_read_cursor() as cursor:
+        _execute_prepared(cursor, _Q_GET_USER_BY_EMAIL, (email,))
         row = cursor.fetchone()
-        return dict(row) if row else None
-    finally:
-        release_connection(conn)
+        return _row_dict(row) if row else None
 
 
 def get_user_by_id(user_id: str) -> dict | None:
-    conn = get_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
+    user = _cached_user(user_id)
+    if user is not None:
+        return user
+    with db_read_cursor() as cursor:
+        _execute_prepared(cursor, _Q_GET_USER_BY_ID, (user_id,))
         row = cursor.fetchone()
-        return dict(row) if row else None
-    finally:
-        release_connection(conn)
+    if row is None:
+        return None
+    user = _row_dict(row)
+    _cache_user(user)
+    return user
+
+
+def update_user_password_hash(user_id: str, hashed_password: str) -> bool:
+    with db_cursor() as cursor:
+        cursor.execute(p('UPDATE users SET hashed_password = ? WHERE id = ? RETURNING 1'), (hashed_password, user_id))
+        updated = cursor.fetchone() is not None
+    forget_user(user_id)
+    return updated
+
+
+def email_exists(email: str) -> bool:
+    with db_read_cursor() as cursor:
+        _execute_prepared(cursor, _Q_EMAIL_EXISTS, (email,))
+        return cursor.fetchone() is not None
 
 
 # Message operations
-def create_message(message_data: dict) -> dict:
-    conn = get_connection()
-    try:
-        cursor = conn.cursor()
-        
-        # Prepare the insert statement with all the fields
-        fields = [
-            'id', 'user_id', 'sender', 'sender_domain', 'subject', 'snippet',
-            'zone', 'confidence', 'reason', 'jone5_message', 'received_at',
-            'classified_at', 'corrected', 'corrected_at', 'source_id', 'source_name',
-            'grant_id', 'provider_message_id', 'thread_id', 'provider',
-            'raw_body', 'raw_body_html', 'raw_headers', 'email_metadata',
-            'attachments', 'has_attachments', 'status', 'read_status',
-            'starred', 'important', 'summary', 'recommended_action',
-            'action_type', 'draft_reply', 'llm_fallback'
-        ]
-        
-        placeholders = ', '.join(['?' for _ in fields])
-        
-        cursor.execute(f'''
-            INSERT INTO messages ({placeholders})
-            VALUES ({placeholders})
-        ''', tuple(message_data.get(field) for field in fields))
-        
-        conn.commit()
-        return message_data
-    finally:
-        release_connection(conn)
+def _json_column(value):
+    """Serialise dict/list values for TEXT JSON columns; strings pass through."""
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value)
 
 
-def get_message_by_id(message_id: str, user_id: str) -> dict | None:
-    conn = get_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM messages 
-            WHERE id = ? AND user_id = ?
-        ''', (message_id, user_id))
-        row = cursor.fetchone()
-        return dict(row) if row else None
-    finally:
-        release_connection(conn)
+@functools.lru_cache(maxsize=1024)
+def _folders_json(folders: tuple) -> str:
+    return json.dumps(list(folders))
 
 
-def get_messages_by_user(user_id: str, zone: str = None, limit: int = 100) -> list:
-    conn = get_connection()
+def _folders_column(folders):
+    """Folder lists bind as JSON text (Postgres casts it to jsonb); each distinct list is encoded once."""
     try:
-        cursor = conn.cursor()
-        
-        if zone:
-            cursor.execute('''
-                SELECT * FROM messages 
-                WHERE user_id = ? AND zone = ?
-                ORDER BY received_at DESC
-                LIMIT ?
-            ''', (user_id, zone, limit))
+        return _folders_json(tuple(folders or ()))
+    except TypeError:  # unhashable entries; encode directly
+        return json.dumps(list(folders))
+
+
+# (column, converter) in insert order; add new message columns here
+MESSAGE_COLUMNS = [
+    ('id', None), ('user_id', None), ('sender', None), ('sender_domain', None),
+    ('subject', None), ('snippet', None), ('zone', None), ('confidence', None),
+    ('reason', None), ('jone5_message', None), ('received_at', None),
+    ('classified_at', None), ('corrected', None), ('corrected_at', None),
+    ('source_id', None), ('source_name', None), ('grant_id', None),
+    ('provider_message_id', None), ('thread_id', None), ('provider', None),
+    ('provider_folders', _folders_column), ('provider_unread', None),
+    ('raw_body', None), ('raw_body_html', None), ('raw_headers', None),
+    ('email_metadata', _json_column), ('attachments', _json_column),
+    ('has_attachments', None), ('status', None), ('read_status', None),
+    ('starred', None), ('important', None), ('summary', None),
+    ('recommended_action', None), ('action_type', None), ('draft_reply', None),
+    ('llm_fallback', None),
+]
+MESSAGE_FIELDS = [column for column, _ in MESSAGE_COLUMNS]
+# Generated once at import from MESSAGE_COLUMNS
+_INSERT_MESSAGE_SQL = p(
+    f"INSERT INTO messages ({', '.join(MESSAGE_FIELDS)}) VALUES ({', '.join('?' for _ in MESSAGE_FIELDS)})"
+)
+# Batches at least this large are loaded with COPY on Postgres
+MESSAGE_COPY_MIN_ROWS = 1000
+
+
+# Only a few columns need converting; everything else is a plain dict lookup
+_MESSAGE_CONVERTERS = [(index, convert) for index, (_, convert) in enumerate(MESSAGE_COLUMNS) if convert]
+
+
+def _message_row(message: dict) -> tuple:
+    """Build the INSERT parameter tuple for a message dict."""
+    # map() over dict.get does the lookups in C; missing fields become None
+    row = list(map(message.get, MESSAGE_FIELDS))
+    for index, convert in _MESSAGE_CONVERTERS:
+        row[index] = convert(row[index])
+    return tuple(row)
+
+
+def create_message(message_data: dict) -> dict:
+    with db_cursor() as cursor:
+        cursor.execute(_INSERT_MESSAGE_SQL, _message_row(message_data))
+        return message_data
+
+
+def bulk_create_messages(messages: list[dict]) -> int:
+    """Insert many messages in a single transaction; returns the number inserted."""
+    if not messages:
+        return 0
+    rows = [_message_row(message) for message in messages]
+    with db_cursor() as cursor:
+        if USE_POSTGRES and len(rows) >= MESSAGE_COPY_MIN_ROWS:
+            with cursor.copy(f"COPY messages ({', '.join(MESSAGE_FIELDS)}) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row(row)
         else:
-            cursor.execute('''
-                SELECT * FROM messages 
-                WHERE user_id = ?
-                ORDER BY received_at DESC
-                LIMIT ?
-            ''', (user_id, limit))
-        
-        rows = cursor.fetchall()
-        return [dict(row) for row in rows]
-    finally:
-        release_connection(conn)
+            cursor.executemany(_INSERT_MESSAGE_SQL, rows)
+    return len(rows)
+
+
+def get_message_by_id(message_id: str, user_id: str) -> dict | None:
+    with db_read_cursor() as cursor:
+        _execute_prepared(cursor, _Q_GET_MESSAGE_BY_ID, (message_id, user_id))
+        row = cursor.fetchone()
+        return _normalize_provider_fields(_row_dict(row)) if row else None
+
+
+# Listing columns: everything except the raw body/header blobs
+LIGHT_MSG_COLS = (
+    "id, user_id, sender, sender_domain, subject, snippet, zone, confidence, reason, jone5_message, "
+    "received_at, classified_at, corrected, corrected_at, source_id, source_name, "
+    "grant_id, provider_message_id, thread_id, provider, provider_folders, provider_unread, email_metadata, attachments, has_attachments, "
+    "status, snoozed_until, needs_reply, replied_at, read_status, starred, important, summary, recommended_action, action_type, "
+    "draft_reply, llm_fallback"
+)
+# Card view only; the raw body/header blobs come from get_message_body
+_Q_GET_MESSAGE_BY_ID = p(f'SELECT {LIGHT_MSG_COLS} FROM messages WHERE id = ? AND user_id = ?')
+_Q_GET_MESSAGE_BODY = p('SELECT id, raw_body, raw_body_html, raw_headers FROM messages WHERE id = ? AND user_id = ?')
+
+
+def _messages_query(user_id: str, zone: str | None, limit: int, before_received_at: str | None) -> tuple[str, list]:
+    """Build the message listing query shared by the sync and async readers."""
+    conditions = ['user_id = ?']
+    params = [user_id]
+    if zone:
+        conditions.append('zone = ?')
+        params.append(zone)
+    if before_received_at:
+        conditions.append('received_at < ?')
+        params.append(before_received_at)
+    params.append(limit)
+    return p(f'''
+        SELECT {LIGHT_MSG_COLS} FROM messages 
+        WHERE {' AND '.join(conditions)}
+        ORDER BY received_at DESC
+        LIMIT ?
+    '''), params
+
+
+def _normalize_message_rows(rows) -> list:
+    # Most messages share a handful of folder sets, so decode each once
+    folders_cache = {}
+    return [_normalize_provider_fields(_row_dict(row), folders_cache) for row in rows]
+
+
+def get_messages_by_user(user_id: str, zone: str = None, limit: int = 100, before_received_at: str | None = None) -> list:
+    """List a user's messages newest first; pass the last received_at to fetch the next page."""
+    query, params = _messages_query(user_id, zone, limit, before_received_at)
+    with db_read_cursor(replica=True) as cursor:
+        cursor.execute(query, params)
+        return _normalize_message_rows(cursor.fetchall())
+
+
+def get_message_body(message_id: str, user_id: str) -> dict | None:
+    """Fetch the raw body/header blobs for one message (detail view)."""
+    with db_read_cursor() as cursor:
+        cursor.execute(_Q_GET_MESSAGE_BODY, (message_id, user_id))
+        row = cursor.fetchone()
+        return _row_dict(row) if row else None
 
 
 def update_message_full_content(message_id: str, user_id: str, raw_body: str | None, raw_body_html: str | None) -> bool:
-    conn = get_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute('''
+    with db_cursor() as cursor:
+        cursor.execute(p('''
             UPDATE messages 
             SET raw_body = ?, raw_body_html = ?
             WHERE id = ? AND user_id = ?
-        ''', (raw_body, raw_body_html, message_id, user_id))
-        conn.commit()
+        '''), (raw_body, raw_body_html, message_id, user_id))
         return cursor.rowcount > 0
-    finally:
-        release_connection(conn)
+
+
+# Server-side UTC clock. TEXT timestamp columns hold ISO-8601 strings, so compare against the same format.
+if USE_POSTGRES:
+    _SQL_UTC_NOW_ISO = "to_char(NOW() AT TIME ZONE 'UTC', 'YYYY-MM-DD\"T\"HH24:MI:SS.US')"
+    _SQL_UTC_DAY_AGO = "(NOW() AT TIME ZONE 'UTC' - INTERVAL '1 day')"
+else:
+    _SQL_UTC_NOW_ISO = "strftime('%Y-%m-%dT%H:%M:%f', 'now')"
+    _SQL_UTC_DAY_AGO = "strftime('%Y-%m-%dT%H:%M:%f', 'now', '-1 day')"
+
+
+def update_message_status(message_id: str, user_id: str, status: str, snoozed_until: str | None = None) -> dict | None:
+    """Set a message's status; returns the updated id/status/snoozed_until, or None if not found."""
+    with db_cursor() as cursor:
+        cursor.execute(p('''
+            UPDATE messages SET status = ?, snoozed_until = ?
+            WHERE id = ? AND user_id = ?
+            RETURNING id, status, snoozed_until
+        '''), (status, snoozed_until or None, message_id, user_id))
+        row = cursor.fetchone()
+        return _row_dict(row) if row else None
+
+
+def mark_message_replied(message_id: str, user_id: str) -> bool:
+    with db_cursor() as cursor:
+        cursor.execute(
+            p(f'UPDATE messages SET needs_reply = 0, replied_at = {_SQL_UTC_NOW_ISO} WHERE id = ? AND user_id = ? RETURNING 1'),
+            (message_id, user_id),
+        )
+        return cursor.fetchone() is not None
+
+
+# Action Center buckets, fetched in one statement and split client-side by `bucket`.
+# Urgent items are one leg per zone so each is a range scan on idx_messages_open_zone_recv.
+# What the Action Center renders per message; leaves out the raw body/header blobs
+ACTION_ITEM_COLS = [
+    'id', 'user_id', 'sender', 'sender_domain', 'subject', 'snippet', 'zone', 'confidence', 'reason',
+    'jone5_message', 'received_at', 'classified_at', 'corrected', 'summary', 'recommended_action',
+    'action_type', 'draft_reply', 'llm_fallback', 'status', 'snoozed_until', 'replied_at',
+    'provider_folders', 'provider_unread',
+]
+_ACTION_BUCKETS = {1: 'urgent_items', 2: 'needs_reply', 3: 'snoozed_due'}
+_Q_ACTION_ITEMS = p(f'''
+    SELECT 1 AS bucket, 1 AS bucket_rank, NULL AS snooze_key, {', '.join(ACTION_ITEM_COLS)}
+    FROM messages
+    WHERE user_id = ? AND zone = 'STAT' AND (status IS NULL OR status = 'active')
+    UNION ALL
+    SELECT 1, 2, NULL, {', '.join(ACTION_ITEM_COLS)}
+    FROM messages
+    WHERE user_id = ? AND zone = 'TODAY' AND (status IS NULL OR status = 'active')
+    UNION ALL
+    SELECT 2, 0, NULL, {', '.join(ACTION_ITEM_COLS)}
+    FROM messages
+    WHERE user_id = ? AND (status IS NULL OR status = 'active') AND action_type = 'reply' AND replied_at IS NULL
+    UNION ALL
+    SELECT 3, 0, snoozed_until, {', '.join(ACTION_ITEM_COLS)}
+    FROM messages
+    WHERE user_id = ? AND status = 'snoozed' AND snoozed_until <= {_SQL_UTC_NOW_ISO}
+    UNION ALL
+    SELECT 4, COUNT(*), NULL, {', '.join('NULL' for _ in ACTION_ITEM_COLS)}
+    FROM messages
+    WHERE user_id = ? AND status = 'done' AND classified_at >= {_SQL_UTC_DAY_AGO}
+    ORDER BY bucket, bucket_rank, snooze_key, received_at DESC
+''')
+
+
+def get_action_items(user_id: str) -> dict:
+    """Get action items for the Action Center / Daily Brief."""
+    with db_read_cursor(replica=True) as cursor:
+        cursor.execute(_Q_ACTION_ITEMS, (user_id,) * 5)
+        return _action_items_from_rows(cursor.fetchall())
+
+
+def _action_items_from_rows(rows) -> dict:
+    """Split _Q_ACTION_ITEMS rows into the Action Center buckets."""
+    buckets = {name: [] for name in _ACTION_BUCKETS.values()}
+    done_count = 0
+    for row in rows:
+        item = _row_dict(row)
+        bucket = item.pop('bucket')
+        if bucket == 4:
+            # The done-today row carries its count in bucket_rank
+            done_count = item['bucket_rank']
+            continue
+        del item['bucket_rank'], item['snooze_key']
+        buckets[_ACTION_BUCKETS[bucket]].append(_normalize_provider_fields(item))
+
+    return {
+        **buckets,
+        'done_today': done_count,
+        'total_action_items': len(buckets['urgent_items']) + len(buckets['snoozed_due']),
+    }
 
 
 # Nylas grant operations
 def create_nylas_grant(grant: dict) -> dict:
-    conn = get_connection()
-    try:
-        cursor = conn.cursor()
-        encrypted_access = encrypt_token(grant.get('access_token'))
-        encrypted_refresh = encrypt_token(grant.get('refresh_token'))
-        scope = grant.get('scope')
-        last_sync_at = grant.get('last_sync_at')
+    """Insert a grant, or refresh its account details and tokens if grant_id is already stored."""
+    with db_cursor() as cursor:
+        cursor.execute(p(f'''
+            INSERT INTO nylas_grants (id, user_id, grant_id, email, provider, created_at, last_sync_at, access_token, refresh_token, expires_at, token_type, scope)
+            VALUES (?, ?, ?, ?, ?, COALESCE(?, {_SQL_UTC_NOW}), ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (grant_id) DO UPDATE SET
+                email = excluded.email, provider = excluded.provider, last_sync_at = excluded.last_sync_at,
+                access_token = excluded.access_token, refresh_token = excluded.refresh_token,
+                expires_at = excluded.expires_at, token_type = excluded.token_type, scope = excluded.scope
+            RETURNING {GRANT_VIEW_COLS}
+        '''), (
+            f"grant_{uuid.uuid4().hex}",
+            grant['user_id'],
+            grant['grant_id'],
+            grant['email'],
+            grant.get('provider'),
+            grant.get('created_at'),
+            grant.get('last_sync_at'),
+            encrypt_token(grant.get('access_token')),
+            encrypt_token(grant.get('refresh_token')),
+            grant.get('expires_at'),
+            grant.get('token_type'),
+            grant.get('scope'),
+        ))
+        # The stored row, already limited to the sanitized view
+        return _row_dict(cursor.fetchone())
+
+
+# --- Async readers for request handlers ---
+# SQLite has no async driver, so those builds run the sync reader in a worker thread.
+
+async def aget_user_by_id(user_id: str) -> dict | None:
+    user = _cached_user(user_id)
+    if user is not None:
+        return user
+    if not USE_POSTGRES:
+        return await asyncio.to_thread(get_user_by_id, user_id)
+    async with adb_cursor() as cursor:
+        await cursor.execute(_Q_GET_USER_BY_ID, (user_id,), prepare=True)
+        row = await cursor.fetchone()
+    if row is None:
+        return None
+    _cache_user(row)
+    return row
 
-        cursor.execute('SELECT id, created_at FROM nylas_grants WHERE grant_id = ?', (grant['grant_id'],))
-        existing = cursor.fetchone()
 
-        if existing:
-            existing_dict = dict(existing)
-            cursor.execute('''
-                UPDATE nylas_grants
-                SET email = ?, provider = ?, last_sync_at = ?, access_token = ?, refresh_token = ?, expires_at = ?, token_type = ?, scope = ?
-                WHERE grant_id = ?
-            ''', (
-                grant['email'],
-                grant.get('provider'),
-                last_sync_at,
-                encrypted_access,
-                encrypted_refresh,
-                grant.get('expires_at'),
-                grant.get('token_type'),
-                scope,
-                grant['grant_id']
-            ))
-            grant_id = grant['grant_id']
-        else:
-            grant_id = f"grant_{uuid.uuid4().hex}"
-            cursor.execute('''
-                INSERT INTO nylas_grants (id, user_id, grant_id, email, provider, created_at, last_sync_at, access_token, refresh_token, expires_at, token_type, scope)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                grant_id,
-                grant['user_id'],
-                grant['grant_id'],
-                grant['email'],
-                grant.get('provider'),
-                grant.get('created_at', datetime.utcnow().isoformat()),
-                last_sync_at,
-                encrypted_access,
-                encrypted_refresh,
-                grant.get('expires_at'),
-                grant.get('token_type'),
-                scope,
-            ))
+async def aget_user_by_email(email: str) -> dict | None:
+    if not USE_POSTGRES:
+        return await asyncio.to_thread(get_user_by_email, email)
+    async with adb_cursor() as cursor:
+        await cursor.execute(_Q_GET_USER_BY_EMAIL, (email,), prepare=True)
+        row = await cursor.fetchone()
+        return _row_dict(row) if row else None
+
+
+async def aget_message_by_id(message_id: str, user_id: str) -> dict | None:
+    if not USE_POSTGRES:
+        return await asyncio.to_thread(get_message_by_id, message_id, user_id)
+    async with adb_cursor() as cursor:
+        await cursor.execute(_Q_GET_MESSAGE_BY_ID, (message_id, user_id), prepare=True)
+        row = await cursor.fetchone()
+        return _normalize_provider_fields(_row_dict(row)) if row else None
+
+
+async def aget_message_body(message_id: str, user_id: str) -> dict | None:
+    if not USE_POSTGRES:
+        return await asyncio.to_thread(get_message_body, message_id, user_id)
+    async with adb_cursor() as cursor:
+        await cursor.execute(_Q_GET_MESSAGE_BODY, (message_id, user_id))
+        return await cursor.fetchone()
 
-        conn.commit()
-        
-        # Return sanitized grant data
-        sanitized = _sanitize_grant_row({
-            'id': grant_id,
-            'user_id': grant['user_id'],
-            'grant_id': grant['grant_id'],
-            'email': grant['email'],
-            'provider': grant.get('provider'),
-            'created_at': existing_dict.get('created_at') if existing else grant.get('created_at'),
-            'last_sync_at': last_sync_at,
-            'expires_at': grant.get('expires_at'),
-            'token_type': grant.get('token_type'),
-            'scope': scope,
-        })
-        return sanitized
-
-    finally:
-        release_connection(conn)
+
+async def aget_messages_by_user(user_id: str, zone: str = None, limit: int = 100, before_received_at: str | None = None) -> list:
+    if not USE_POSTGRES:
+        return await asyncio.to_thread(get_messages_by_user, user_id, zone, limit, before_received_at)
+    query, params = _messages_query(user_id, zone, limit, before_received_at)
+    async with adb_cursor() as cursor:
+        await cursor.execute(query, params)
+        return _normalize_message_rows(await cursor.fetchall())
+
+
+async def aget_action_items(user_id: str) -> dict:
+    if not USE_POSTGRES:
+        return await asyncio.to_thread(get_action_items, user_id)
+    async with adb_cursor() as cursor:
+        await cursor.execute(_Q_ACTION_ITEMS, (user_id,) * 5)
+        return _action_items_from_rows(await cursor.fetchall())
+
+
+async def aget_nylas_grants_by_user(user_id: str) -> list:
+    if not USE_POSTGRES:
+        return await asyncio.to_thread(get_nylas_grants_by_user, user_id)
+    async with adb_cursor() as cursor:
+        await cursor.execute(_Q_GET_GRANTS_BY_USER, (user_id,))
+        return await cursor.fetchall()
 
 
 def get_nylas_grants_by_user(user_id: str) -> list:
-    conn = get_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, user_id, grant_id, email, provider, created_at, last_sync_at, expires_at, token_type, scope
-            FROM nylas_grants
-            WHERE user_id = ?
-            ORDER BY created_at DESC
-        ''', (user_id,))
+    with db_read_cursor() as cursor:
+        cursor.execute(_Q_GET_GRANTS_BY_USER, (user_id,))
         rows = cursor.fetchall()
-        return [_sanitize_grant_row(dict(row)) for row in rows]
-    finally:
-        release_connection(conn)
+        return [_row_dict(row) for row in rows]
 
 
 def get_nylas_grant_by_grant_id(grant_id: str) -> dict | None:
-    conn = get_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, user_id, grant_id, email, provider, created_at, last_sync_at, expires_at, token_type, scope
-            FROM nylas_grants
-            WHERE grant_id = ?
-        ''', (grant_id,))
+    with db_read_cursor() as cursor:
+        _execute_prepared(cursor, _Q_GET_GRANT_BY_GRANT_ID, (grant_id,))
         row = cursor.fetchone()
-        return _sanitize_grant_row(dict(row)) if row else None
-    finally:
-        release_connection(conn)
+        return _row_dict(row) if row else None
 
 
 def get_nylas_grant_credentials(grant_id: str) -> dict | None:
-    conn = get_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT user_id, email, provider, access_token, refresh_token, expires_at, token_type, scope
-            FROM nylas_grants
-            WHERE grant_id = ?
-        ''', (grant_id,))
+    with db_cursor() as cursor:
+        _execute_prepared(cursor, _Q_GET_GRANT_CREDENTIALS, (grant_id,))
         row = cursor.fetchone()
         if row:
-            data = dict(row)
+            data = _row_dict(row)
             # Decrypt tokens
             if data['access_token']:
                 data['access_token'] = decrypt_token(data['access_token'])
@@ -612,37 +1191,178 @@ def get_nylas_grant_credentials(grant_id: str) -> dict | None:
                 data['refresh_token'] = decrypt_token(data['refresh_token'])
             return data
         return None
-    finally:
-        release_connection(conn)
+
+
+# Keeps each IN (...) list well under SQLite's bound-parameter limit
+_IN_LIST_CHUNK = 500
+
+
+def _decrypt_credentials(results: list) -> list:
+    """Decrypt access/refresh tokens in place across a batch of credential rows."""
+    tokens = decrypt_tokens([token for data in results for token in (data['access_token'], data['refresh_token'])])
+    for data, access_token, refresh_token in zip(results, tokens[::2], tokens[1::2]):
+        data['access_token'] = access_token
+        data['refresh_token'] = refresh_token
+    return results
+
+
+def get_nylas_grant_credentials_many(grant_ids: list[str]) -> dict[str, dict]:
+    """Credentials for many grants in one query, keyed by grant_id; unknown ids are omitted."""
+    unique_ids = list(dict.fromkeys(grant_ids))
+    if not unique_ids:
+        return {}
+    columns = GRANT_CREDENTIAL_COLS
+    with db_cursor() as cursor:
+        if USE_POSTGRES:
+            cursor.execute(f'SELECT {columns} FROM nylas_grants WHERE grant_id = ANY(%s)', (unique_ids,))
+            results = cursor.fetchall()
+        else:
+            results = []
+            for start in range(0, len(unique_ids), _IN_LIST_CHUNK):
+                chunk = unique_ids[start:start + _IN_LIST_CHUNK]
+                cursor.execute(f"SELECT {columns} FROM nylas_grants WHERE grant_id IN ({', '.join('?' for _ in chunk)})", chunk)
+                results.extend(_row_dict(row) for row in cursor.fetchall())
+    return {data['grant_id']: data for data in _decrypt_credentials(results)}
 
 
 def get_all_nylas_grant_credentials() -> list:
-    conn = get_connection()
+    with db_cursor() as cursor:
+        cursor.execute(f'SELECT {GRANT_CREDENTIAL_COLS} FROM nylas_grants')
+        results = [_row_dict(row) for row in cursor.fetchall()]
+    # Decrypt outside the cursor so the connection goes back to the pool first
+    return _decrypt_credentials(results)
+
+
+def iter_all_nylas_grant_credentials(batch_size: int = 500):
+    """Yield every grant's decrypted credentials, fetching batch_size rows at a time."""
+    query = f'SELECT {GRANT_CREDENTIAL_COLS} FROM nylas_grants'
+    if USE_POSTGRES and getattr(_tx_local, "cursor", None) is None:
+        # A named (server-side) cursor keeps the full result off the client
+        with _get_pg_pool().connection() as conn:
+            with conn.cursor(name="grant_credentials") as cursor:
+                cursor.execute(query)
+                while rows := cursor.fetchmany(batch_size):
+                    yield from _decrypt_credentials(rows)
+        return
+    with db_cursor() as cursor:
+        cursor.execute(query)
+        while rows := cursor.fetchmany(batch_size):
+            yield from _decrypt_credentials([_row_dict(row) for row in rows])
+
+
+# Write-behind buffer for grant sync times: latest value per grant, flushed in one bulk UPDATE
+_SYNC_FLUSH_INTERVAL = 1.0
+_SYNC_FLUSH_MAX_PENDING = 500
+# A row that keeps failing on its own is dropped after this many flushes instead of blocking the buffer
+_SYNC_FLUSH_MAX_ATTEMPTS = 3
+# grant_id -> (last_sync_at, failed flush attempts)
+_pending_sync_times: dict[str, tuple[str | None, int]] = {}
+_pending_sync_lock = threading.Lock()
+_sync_flush_wakeup = threading.Event()
+_sync_flusher = None
+
+
+def _normalize_sync_time(last_sync_at) -> str | None:
+    """Return last_sync_at as a naive-UTC ISO string (None stays None); raise ValueError if it isn't a timestamp."""
+    if last_sync_at is None:
+        return None
+    if isinstance(last_sync_at, str):
+        last_sync_at = datetime.fromisoformat(last_sync_at)
+    if not isinstance(last_sync_at, datetime):
+        raise ValueError(f"last_sync_at must be a datetime or ISO-8601 string, got {last_sync_at!r}")
+    if last_sync_at.tzinfo is not None:
+        last_sync_at = last_sync_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return last_sync_at.isoformat()
+
+
+def update_nylas_grant_sync_time(grant_id: str, last_sync_at: str | datetime | None):
+    """Record a grant's last sync time; outside transaction() it is written within about a second."""
+    global _sync_flusher
+    # Reject bad values here, where the caller sees the error, rather than at flush time
+    last_sync_at = _normalize_sync_time(last_sync_at)
+    if getattr(_tx_local, "cursor", None) is not None:
+        # Part of a caller's transaction, so it must commit (or roll back) with it
+        with db_cursor() as cursor:
+            cursor.execute(p('UPDATE nylas_grants SET last_sync_at = ? WHERE grant_id = ?'), (last_sync_at, grant_id))
+        return
+    with _pending_sync_lock:
+        _pending_sync_times[grant_id] = (last_sync_at, 0)
+        pending = len(_pending_sync_times)
+        if _sync_flusher is None:
+            _sync_flusher = threading.Thread(target=_sync_flush_loop, name="grant-sync-flush", daemon=True)
+            _sync_flusher.start()
+    if pending >= _SYNC_FLUSH_MAX_PENDING:
+        _sync_flush_wakeup.set()
+
+
+def flush_sync_times() -> None:
+    """Write any buffered grant sync times now."""
+    with _pending_sync_lock:
+        batch = list(_pending_sync_times.items())
+        _pending_sync_times.clear()
+    if not batch:
+        return
     try:
-        cursor = conn.cursor()
-        cursor.execute('SELECT grant_id, user_id, email, provider, access_token, refresh_token, expires_at, token_type, scope FROM nylas_grants')
-        rows = cursor.fetchall()
-        results = []
-        for row in rows:
-            data = dict(row)
-            if data['access_token']:
-                data['access_token'] = decrypt_token(data['access_token'])
-            if data['refresh_token']:
-                data['refresh_token'] = decrypt_token(data['refresh_token'])
-            results.append(data)
-        return results
-    finally:
-        release_connection(conn)
+        update_nylas_grant_sync_times([(grant_id, last_sync_at) for grant_id, (last_sync_at, _) in batch])
+        return
+    except Exception as e:
+        print(f"Error flushing {len(batch)} grant sync times, retrying one by one: {e}")
+    # Row by row, so one bad entry can't hold back the rest
+    for grant_id, (last_sync_at, attempts) in batch:
+        try:
+            update_nylas_grant_sync_times([(grant_id, last_sync_at)])
+        except Exception as e:
+            attempts += 1
+            if attempts >= _SYNC_FLUSH_MAX_ATTEMPTS:
+                print(f"Dropping sync time {last_sync_at!r} for grant {grant_id} after {attempts} failed flushes: {e}")
+                continue
+            with _pending_sync_lock:
+                # Keep it for the next flush unless a newer time arrived meanwhile
+                _pending_sync_times.setdefault(grant_id, (last_sync_at, attempts))
+
+
+def _sync_flush_loop() -> None:
+    while True:
+        _sync_flush_wakeup.wait(_SYNC_FLUSH_INTERVAL)
+        _sync_flush_wakeup.clear()
+        flush_sync_times()
+
+
+atexit.register(flush_sync_times)
+
+
+def update_nylas_grant_sync_times(sync_times: list[tuple[str, str | None]]) -> None:
+    """Record last_sync_at for many grants at once from (grant_id, last_sync_at) pairs."""
+    if not sync_times:
+        return
+    with db_cursor() as cursor:
+        if USE_POSTGRES:
+            # One statement however many grants: the pairs travel as two array parameters
+            grant_ids, timestamps = zip(*sync_times)
+            cursor.execute('''
+                UPDATE nylas_grants SET last_sync_at = v.last_sync_at
+                FROM unnest(%s::text[], %s::timestamp[]) AS v(grant_id, last_sync_at)
+                WHERE nylas_grants.grant_id = v.grant_id
+            ''', (list(grant_ids), list(timestamps)))
+        else:
+            # In-process, so one transaction around executemany is already the cheap path
+            cursor.executemany(
+                'UPDATE nylas_grants SET last_sync_at = ? WHERE grant_id = ?',
+                [(ts, grant_id) for grant_id, ts in sync_times],
+            )
 
 
-def update_nylas_grant_sync_time(grant_id: str, last_sync_at: str):
-    conn = get_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute('UPDATE nylas_grants SET last_sync_at = ? WHERE grant_id = ?', (last_sync_at, grant_id))
-        conn.commit()
-    finally:
-        release_connection(conn)
+# Columns update_nylas_grant_tokens may set, in SET-clause order
+_GRANT_TOKEN_COLUMNS = ('access_token', 'refresh_token', 'expires_at', 'token_type', 'scope')
+
+
+@functools.lru_cache(maxsize=32)
+def _grant_update_sql(columns: tuple[str, ...]) -> str:
+    """UPDATE for a subset of grant token columns; at most 31 shapes, each built once."""
+    unknown = set(columns).difference(_GRANT_TOKEN_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown grant columns: {sorted(unknown)}")
+    return p(f"UPDATE nylas_grants SET {', '.join(f'{column} = ?' for column in columns)} WHERE grant_id = ?")
 
 
 def update_nylas_grant_tokens(
@@ -653,89 +1373,93 @@ def update_nylas_grant_tokens(
     token_type: str | None = None,
     scope: str | None = None,
 ) -> bool:
-    conn = get_connection()
-    try:
-        cursor = conn.cursor()
-        updates = {}
-        if access_token is not None:
-            updates['access_token'] = encrypt_token(access_token)
-        if refresh_token is not None:
-            updates['refresh_token'] = encrypt_token(refresh_token)
-        if expires_at is not None:
-            updates['expires_at'] = expires_at
-        if token_type is not None:
-            updates['token_type'] = token_type
-        if scope is not None:
-            updates['scope'] = scope
-
-        if updates:
-            set_clause = ', '.join(f"{column} = ?" for column in updates.keys())
-            values = list(updates.values())
-            values.append(grant_id)
-            cursor.execute(f'UPDATE nylas_grants SET {set_clause} WHERE grant_id = ?', values)
-            updated = cursor.rowcount > 0
-            conn.commit()
-            return updated
+    requested = {
+        'access_token': access_token,
+        'refresh_token': refresh_token,
+        'expires_at': expires_at,
+        'token_type': token_type,
+        'scope': scope,
+    }
+    requested = {column: value for column, value in requested.items() if value is not None}
+    if not requested:
         return False
-    finally:
-        release_connection(conn)
+
+    with db_cursor() as cursor:
+        cursor.execute(p(f"SELECT {', '.join(_GRANT_TOKEN_COLUMNS)} FROM nylas_grants WHERE grant_id = ?"), (grant_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return False
+        current = _row_dict(row)
+        # Stored tokens are AES-GCM with a random nonce, so compare plaintexts (decrypts are cached)
+        current['access_token'] = decrypt_token(current['access_token'])
+        current['refresh_token'] = decrypt_token(current['refresh_token'])
+        changed = {column: value for column, value in requested.items() if current[column] != value}
+        if not changed:
+            # A refresh that hands back the same values needs no write
+            return True
+        for column in ('access_token', 'refresh_token'):
+            if column in changed:
+                changed[column] = encrypt_token(changed[column])
+        # Same statement text per column set, so Postgres reuses its prepared plan
+        _execute_prepared(cursor, _grant_update_sql(tuple(changed)), (*changed.values(), grant_id))
+        return cursor.rowcount > 0
 
 
 def delete_nylas_grant(grant_id: str, user_id: str) -> bool:
-    conn = get_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM nylas_grants WHERE grant_id = ? AND user_id = ?', (grant_id, user_id))
-        deleted = cursor.rowcount > 0
-        conn.commit()
-        return deleted
-    finally:
-        release_connection(conn)
+    with db_cursor() as cursor:
+        cursor.execute(p('DELETE FROM nylas_grants WHERE grant_id = ? AND user_id = ? RETURNING 1'), (grant_id, user_id))
+        return cursor.fetchone() is not None
 
 
 # Source operations
 def create_source(source_data: dict) -> dict:
-    conn = get_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute('''
+    with db_cursor() as cursor:
+        cursor.execute(p(f'''
             INSERT INTO sources (id, user_id, name, inbound_token, inbound_address, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
+            VALUES (?, ?, ?, ?, ?, COALESCE(?, {_SQL_UTC_NOW}))
+        '''), (
             source_data["id"],
             source_data["user_id"],
             source_data["name"],
             source_data["inbound_token"],
             source_data["inbound_address"],
-            source_data.get("created_at", datetime.utcnow().isoformat())
+            source_data.get("created_at")
         ))
-        conn.commit()
         return source_data
-    finally:
-        release_connection(conn)
 
 
 def get_source_by_token(token: str) -> dict | None:
-    conn = get_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM sources WHERE inbound_token = ?', (token,))
+    with db_read_cursor() as cursor:
+        _execute_prepared(cursor, _Q_GET_SOURCE_BY_TOKEN, (token,))
+        row = cursor.fetchone()
+        return _row_dict(row) if row else None
+
+
+# Rule override operations
+def set_rule_override(sender_key: str, zone: str):
+    with db_cursor() as cursor:
+        cursor.execute(p(f'''
+            INSERT INTO rule_overrides (id, sender_key, zone, created_at)
+            VALUES (?, ?, ?, {_SQL_UTC_NOW})
+            ON CONFLICT (sender_key) DO UPDATE SET zone = excluded.zone, created_at = excluded.created_at
+        '''), (str(uuid.uuid4()), sender_key, zone))
+
+
+def get_rule_override(sender_key: str) -> str | None:
+    with db_read_cursor() as cursor:
+        _execute_prepared(cursor, _Q_GET_RULE_OVERRIDE, (sender_key,))
         row = cursor.fetchone()
-        return dict(row) if row else None
-    finally:
-        release_connection(conn)
+        return row['zone'] if row else None
 
 
 # CloudMailin operations
 def create_cloudmailin_message(message_data: dict) -> dict:
-    conn = get_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute('''
+    with db_cursor() as cursor:
+        cursor.execute(p(f'''
             INSERT INTO cloudmailin_messages 
             (id, user_id, sender, sender_domain, subject, snippet, zone, confidence, reason, jone5_message, received_at, classified_at, corrected, source_id, source_name)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, {_SQL_UTC_NOW}), COALESCE(?, {_SQL_UTC_NOW}), ?, ?, ?)
+        '''), (
             message_data["id"],
             message_data.get("user_id", "cloudmailin-default-user"),
             message_data["sender"],
@@ -746,96 +1470,93 @@ def create_cloudmailin_message(message_data: dict) -> dict:
             message_data["confidence"],
             message_data["reason"],
             message_data["jone5_message"],
-            message_data.get("received_at", datetime.utcnow().isoformat()),
-            message_data.get("classified_at", datetime.utcnow().isoformat()),
+            message_data.get("received_at"),
+            message_data.get("classified_at"),
             message_data.get("corrected", False),
             message_data.get("source_id", "cloudmailin"),
             message_data.get("source_name", "CloudMailin")
         ))
-        conn.commit()
         return message_data
-    finally:
-        release_connection(conn)
 
 
 def get_cloudmailin_messages() -> list:
-    conn = get_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM cloudmailin_messages ORDER BY received_at DESC')
+    with db_read_cursor(replica=True) as cursor:
+        cursor.execute(p('SELECT * FROM cloudmailin_messages ORDER BY received_at DESC'))
         rows = cursor.fetchall()
-        return [dict(row) for row in rows]
-    finally:
-        release_connection(conn)
+        return [_row_dict(row) for row in rows]
 
 
 def update_cloudmailin_message_status(message_id: str, status: str, snoozed_until: str | None = None) -> bool:
-    conn = get_connection()
-    try:
-        cursor = conn.cursor()
+    with db_cursor() as cursor:
         if snoozed_until:
-            cursor.execute('''
+            cursor.execute(p('''
                 UPDATE cloudmailin_messages 
                 SET status = ?, snoozed_until = ?
                 WHERE id = ?
-            ''', (status, snoozed_until, message_id))
+            '''), (status, snoozed_until, message_id))
         else:
-            cursor.execute('''
+            cursor.execute(p('''
                 UPDATE cloudmailin_messages 
                 SET status = ?
                 WHERE id = ?
-            ''', (status, message_id))
-        conn.commit()
+            '''), (status, message_id))
         return cursor.rowcount > 0
-    finally:
-        release_connection(conn)
 
 
 def delete_cloudmailin_message(message_id: str) -> bool:
-    conn = get_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM cloudmailin_messages WHERE id = ?', (message_id,))
-        deleted = cursor.rowcount > 0
-        conn.commit()
-        return deleted
-    finally:
-        release_connection(conn)
+    with db_cursor() as cursor:
+        cursor.execute(p('DELETE FROM cloudmailin_messages WHERE id = ? RETURNING 1'), (message_id,))
+        return cursor.fetchone() is not None
 
 
 def get_nylas_grants_by_email(email: str) -> list:
     """Get grants by email (for linking during registration)."""
-    conn = None
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM nylas_grants WHERE email = ?', (email,))
-        rows = cursor.fetchall()
-        return [dict(row) for row in rows]
+        with db_read_cursor() as cursor:
+            cursor.execute(p('SELECT * FROM nylas_grants WHERE email = ?'), (email,))
+            rows = cursor.fetchall()
+            return [_row_dict(row) for row in rows]
     except Exception as e:
         print(f"Error getting grants by email: {e}")
         return []
-    finally:
-        if conn:
-            release_connection(conn)
+
+
+def get_nylas_grants_by_emails(emails: list[str]) -> dict[str, list]:
+    """Get grants for many emails in one query per chunk; returns {email: [grant, ...]}."""
+    grants = {email: [] for email in emails}
+    unique_emails = list(grants)
+    try:
+        with db_read_cursor() as cursor:
+            if USE_POSTGRES:
+                # A single array parameter, so no chunking is needed
+                cursor.execute('SELECT * FROM nylas_grants WHERE email = ANY(%s)', (unique_emails,))
+                rows = cursor.fetchall()
+            else:
+                rows = []
+                for start in range(0, len(unique_emails), _IN_LIST_CHUNK):
+                    chunk = unique_emails[start:start + _IN_LIST_CHUNK]
+                    cursor.execute(
+                        f"SELECT * FROM nylas_grants WHERE email IN ({', '.join('?' for _ in chunk)})", chunk
+                    )
+                    rows.extend(cursor.fetchall())
+            for row in rows:
+                grant = _row_dict(row)
+                grants[grant['email']].append(grant)
+    except Exception as e:
+        print(f"Error getting grants by emails: {e}")
+    return grants
 
 
 def update_nylas_grant_user_id(grant_id: str, user_id: str) -> bool:
     """Update grant user_id (for linking after registration)."""
-    conn = None
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute('UPDATE nylas_grants SET user_id = ? WHERE grant_id = ?', (user_id, grant_id))
-        updated = cursor.rowcount > 0
-        conn.commit()
-        return updated
+        with db_cursor() as cursor:
+            cursor.execute(p('UPDATE nylas_grants SET user_id = ? WHERE grant_id = ?'), (user_id, grant_id))
+            updated = cursor.rowcount > 0
+            return updated
     except Exception as e:
         print(f"Error updating grant user_id: {e}")
         return False
-    finally:
-        if conn:
-            release_connection(conn)
 
 
 def update_message_provider_state(
@@ -848,23 +1569,31 @@ def update_message_provider_state(
     provider_unread: bool = True,
 ):
     """Update message with Nylas provider information."""
-    conn = get_connection()
-    try:
-        cursor = conn.cursor()
-        cursor.execute('''
+    with db_cursor() as cursor:
+        cursor.execute(p('''
             UPDATE messages 
             SET grant_id = ?, provider_message_id = ?, provider = ?, thread_id = ?, provider_folders = ?, provider_unread = ?
             WHERE id = ?
-        ''', (
+        '''), (
             provider_grant_id,
             provider_message_id,
             provider,
             thread_id,
-            json.dumps(provider_folders) if provider_folders else None,
+            _folders_column(provider_folders),
             provider_unread,
             message_id
         ))
-        conn.commit()
         return cursor.rowcount > 0
-    finally:
-        release_connection(conn)
+
+
+def update_message_provider_states(updates: list[tuple[str, list | None, bool]]) -> int:
+    """Set provider_folders/provider_unread for many messages from (message_id, folders, unread) tuples."""
+    if not updates:
+        return 0
+    with db_cursor() as cursor:
+        # psycopg pipelines executemany, so this is one round-trip per batch rather than per message
+        cursor.executemany(
+            p('UPDATE messages SET provider_folders = ?, provider_unread = ? WHERE id = ?'),
+            [(_folders_column(folders), unread, message_id) for message_id, folders, unread in updates],
+        )
+        return cursor.rowcount
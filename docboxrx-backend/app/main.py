@@ -14,14 +14,23 @@ import random
 import os
 import json
 import hashlib
+import secrets
 import threading
+import time
 import email
+from collections import OrderedDict
 from email import policy
 from email.parser import BytesParser
 from cerebras.cloud.sdk import Cerebras
 from nylas import Client as NylasClient
 import asyncio
-from sqlalchemy.exc import IntegrityError
+import anyio
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+import httpx
+import orjson
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 
 # Import database module
 from app import db
@@ -31,7 +40,7 @@ from app.routers.api_contract import router as api_contract_router
 from app.services.vectorizer import vectorizer, EmailInput
 from app.services.router import router as pony_express
 from app.models.state_vector import MessageStateVector
-from app.database import async_session
+from app.database import async_session, engine, close_pg_pool
 
 # Nylas configuration
 NYLAS_API_KEY = os.environ.get("NYLAS_API_KEY")
@@ -46,17 +55,34 @@ NYLAS_API_URI = os.environ.get("NYLAS_API_URI", "https://api.us.nylas.com")
 NYLAS_CALLBACK_URI = os.environ.get("NYLAS_CALLBACK_URI", "https://app.docboxrx.com/api/nylas/callback")
 
 nylas_client = NylasClient(api_key=NYLAS_API_KEY, api_uri=NYLAS_API_URI) if NYLAS_API_KEY else None
+# Async REST client for hot paths: N fetches run as coroutines instead of N threads in the SDK
+httpx_client: Optional[httpx.AsyncClient] = None
 
 NYLAS_REFRESH_HEADROOM = timedelta(minutes=5)
+# Background refresh fires before the request-path headroom so requests rarely wait on a refresh
+NYLAS_REFRESH_LEAD = timedelta(minutes=10)
+# Plain dict: single-key reads and writes are atomic, so the event loop and sync workers share it without a mutex
 nylas_grant_cache: dict[str, dict] = {}
-nylas_grant_cache_lock = threading.Lock()
+nylas_grant_loads: dict[str, asyncio.Task] = {}
+nylas_refresh_locks: dict[str, asyncio.Lock] = {}
+nylas_refresh_timers: dict[str, asyncio.TimerHandle] = {}
 
 # Cerebras API for LLM fallback
 CEREBRAS_API_KEY = os.environ.get("CEREBRAS_API_KEY")
 cerebras_client = Cerebras(api_key=CEREBRAS_API_KEY) if CEREBRAS_API_KEY else None
 LLM_CONFIDENCE_THRESHOLD = 0.70  # Use LLM if rules confidence is below this
+# Templated mail (lab results, refill forms, newsletters) repeats; reuse the analysis by content hash
+LLM_CACHE_SIZE = 4096
+llm_cache: "OrderedDict[str, dict]" = OrderedDict()
+llm_cache_lock = threading.Lock()
 
-app = FastAPI(title="DocBoxRX API", description="Sovereign Email Triage System")
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by orjson."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+app = FastAPI(title="DocBoxRX API", description="Sovereign Email Triage System", default_response_class=FastJSONResponse)
 
 # Better error handling for validation errors (422)
 @app.exception_handler(RequestValidationError)
@@ -66,7 +92,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         field = " -> ".join(str(loc) for loc in error.get("loc", []))
         msg = error.get("msg", "Validation error")
         errors.append(f"{field}: {msg}")
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=422,
         content={"detail": "; ".join(errors) if errors else "Validation error", "errors": exc.errors()}
     )
@@ -92,69 +118,169 @@ app.include_router(api_contract_router)
 @app.on_event("startup")
 async def initialize_system() -> None:
     """Initialize database and preload Nylas grants at startup."""
+    # Warm the connection pools before the first request pays for TLS and auth
+    db.open_pools()
     # Initialize database schema (idempotent)
     db.init_db()
     db.create_state_vector_tables()
 
+    global shadow_worker_task
+    shadow_worker_task = asyncio.create_task(_shadow_worker())
+
     # Preload Nylas grants if client is available
     if not nylas_client:
         return
-    for grant in db.get_all_nylas_grant_credentials():
+    for grant in db.iter_all_nylas_grant_credentials():
         _cache_nylas_grant(grant)
+        _schedule_nylas_refresh(grant)
+
+
+@app.on_event("shutdown")
+async def shutdown_system() -> None:
+    """Release pooled database connections on shutdown."""
+    for timer in nylas_refresh_timers.values():
+        timer.cancel()
+    if shadow_worker_task:
+        shadow_worker_task.cancel()
+        # Flush webhook events that arrived after the worker's last batch
+        pending = []
+        while not shadow_queue.empty():
+            pending.append(shadow_queue.get_nowait())
+        if pending:
+            await process_shadow_batch(list(dict.fromkeys(pending)))
+    if httpx_client:
+        await httpx_client.aclose()
+    db.flush_sync_times()
+    db.close_pools()
+    await close_pg_pool()
+    await db.close_async_pool()
+    await engine.dispose()
+    password_executor.shutdown(wait=False)
+
+
+SHADOW_BATCH_SIZE = 32
+SHADOW_BATCH_WINDOW = 0.05  # seconds to wait for more webhook events before flushing a partial batch
+shadow_queue: "asyncio.Queue[tuple[str, str]]" = asyncio.Queue()
+shadow_worker_task: Optional[asyncio.Task] = None
+
+
+def _get_httpx_client() -> httpx.AsyncClient:
+    """Return the shared Nylas HTTP client, creating it on first use."""
+    global httpx_client
+    if httpx_client is None:
+        httpx_client = httpx.AsyncClient(
+            base_url=NYLAS_API_URI,
+            headers={"Authorization": f"Bearer {NYLAS_API_KEY}", "Accept": "application/json"},
+            http2=True,
+            timeout=15,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        )
+    return httpx_client
 
 
-async def process_shadow_traffic(grant_id: str, message_id: str) -> None:
-    print(f"Shadow Worker: Waking up for message {message_id}...")
+async def _fetch_nylas_message(grant_id: str, message_id: str) -> dict:
+    """Fetch one message from the Nylas v3 REST API."""
+    response = await _get_httpx_client().get(f"/v3/grants/{grant_id}/messages/{message_id}")
+    response.raise_for_status()
+    return response.json()["data"]
+
+
+def _shadow_email_input(grant_id: str, message_id: str, nylas_message) -> EmailInput:
+    """Shape a Nylas message for the vectorizer."""
+    subject = getattr(nylas_message, 'subject', None) or (nylas_message.get('subject') if isinstance(nylas_message, dict) else None) or "No Subject"
+    body_raw = getattr(nylas_message, 'body', None) or (nylas_message.get('body') if isinstance(nylas_message, dict) else None)
+    body_html = getattr(nylas_message, 'body_html', None) or (nylas_message.get('body_html') if isinstance(nylas_message, dict) else None)
+    body_content = body_html or body_raw or "No Body"
 
+    sender = "unknown"
+    from_value = getattr(nylas_message, 'from_', None) or (nylas_message.get('from') if isinstance(nylas_message, dict) else None)
+    if from_value and isinstance(from_value, (list, tuple)):
+        first = from_value[0]
+        if isinstance(first, dict):
+            sender = first.get('email') or first.get('name') or sender
+        else:
+            sender = getattr(first, 'email', None) or getattr(first, 'name', None) or sender
+
+    return EmailInput(
+        subject=subject,
+        body=body_content,
+        sender=sender,
+        message_id=message_id,
+        grant_id=grant_id,
+    )
+
+
+async def process_shadow_batch(events: list[tuple[str, str]]) -> None:
+    """Fetch, vectorize and store a batch of (grant_id, message_id) events."""
     if not nylas_client:
         print("ERROR: Shadow Worker Failed: Nylas not configured")
         return
 
+    fetched = await asyncio.gather(
+        *[_fetch_nylas_message(grant_id, message_id) for grant_id, message_id in events],
+        return_exceptions=True,
+    )
+    email_inputs = []
+    for (grant_id, message_id), result in zip(events, fetched):
+        if isinstance(result, Exception):
+            print(f"ERROR: Shadow Worker Failed for {message_id}: {result}")
+        else:
+            email_inputs.append(_shadow_email_input(grant_id, message_id, result))
+    if not email_inputs:
+        return
+
+    print(f"Vectorizing {len(email_inputs)} message(s)...")
+    vectors = await vectorizer.vectorize_email_batch(email_inputs)
+    rows = [pony_express.route_vector(vector_data) for vector_data in vectors]
+
+    # One multi-row INSERT; duplicates are skipped per row instead of failing the batch
+    stmt = (
+        pg_insert(MessageStateVector)
+        .on_conflict_do_nothing(index_elements=["nylas_message_id"])
+        .returning(MessageStateVector.id, MessageStateVector.nylas_message_id)
+    )
     try:
-        nylas_message = await asyncio.to_thread(nylas_client.messages.find, grant_id, message_id)
-
-        subject = getattr(nylas_message, 'subject', None) or (nylas_message.get('subject') if isinstance(nylas_message, dict) else None) or "No Subject"
-        body_raw = getattr(nylas_message, 'body', None) or (nylas_message.get('body') if isinstance(nylas_message, dict) else None)
-        body_html = getattr(nylas_message, 'body_html', None) or (nylas_message.get('body_html') if isinstance(nylas_message, dict) else None)
-        body_content = body_html or body_raw or "No Body"
-
-        sender = "unknown"
-        from_value = getattr(nylas_message, 'from_', None) or (nylas_message.get('from') if isinstance(nylas_message, dict) else None)
-        if from_value and isinstance(from_value, (list, tuple)):
-            first = from_value[0]
-            if isinstance(first, dict):
-                sender = first.get('email') or first.get('name') or sender
-            else:
-                sender = getattr(first, 'email', None) or getattr(first, 'name', None) or sender
-
-        email_input = EmailInput(
-            subject=subject,
-            body=body_content,
-            sender=sender,
-            message_id=message_id,
-            grant_id=grant_id,
-        )
+        async with async_session() as session, session.begin():
+            result = await session.execute(stmt, rows)
+            saved = {row.nylas_message_id: row.id for row in result}
+    except Exception as e:
+        print(f"ERROR: DB Save Failed: {e}")
+        return
+
+    for row in rows:
+        message_id = row["nylas_message_id"]
+        if message_id in saved:
+            print(f"SUCCESS: Shadow Success! Saved Vector ID: {saved.pop(message_id)} | Risk: {row['risk_score']}")
+        else:
+            print(f"WARNING: Shadow Duplicate: Vector already exists for Nylas message {message_id}")
 
-        print(f"Vectorizing: {email_input.subject[:30]}...")
-        vector_data = await vectorizer.vectorize_email(email_input)
-        routed_data = pony_express.route_vector(vector_data)
 
-        async with async_session() as session:
-            db_obj = MessageStateVector(**routed_data)
-            session.add(db_obj)
+async def process_shadow_traffic(grant_id: str, message_id: str) -> None:
+    print(f"Shadow Worker: Waking up for message {message_id}...")
+    await process_shadow_batch([(grant_id, message_id)])
+
+
+async def _shadow_worker() -> None:
+    """Drain webhook events into batches of up to SHADOW_BATCH_SIZE."""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await shadow_queue.get()]
+        deadline = loop.time() + SHADOW_BATCH_WINDOW
+        while len(batch) < SHADOW_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
             try:
-                await session.commit()
-                await session.refresh(db_obj)
-                print(f"SUCCESS: Shadow Success! Saved Vector ID: {db_obj.id} | Risk: {db_obj.risk_score}")
-            except IntegrityError:
-                await session.rollback()
-                print(f"WARNING: Shadow Duplicate: Vector already exists for Nylas message {message_id}")
-            except Exception as e:
-                await session.rollback()
-                print(f"ERROR: DB Save Failed: {e}")
+                batch.append(await asyncio.wait_for(shadow_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        print(f"Shadow Worker: Waking up for {len(batch)} message(s)...")
+        try:
+            # Nylas retries deliveries, so the same event can land twice in one batch
+            await process_shadow_batch(list(dict.fromkeys(batch)))
+        except Exception as e:
+            print(f"ERROR: Shadow Worker Failed: {e}")
 
-    except Exception as e:
-        print(f"ERROR: Shadow Worker Failed: {e}")
 
 # Security
 SECRET_KEY = os.environ.get("SECRET_KEY")
@@ -162,6 +288,11 @@ if not SECRET_KEY:
     raise ValueError("SECRET_KEY environment variable is required")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24
+# Verified tokens map to their user id for a short while so repeat requests skip the HMAC check;
+# the user row itself comes from db's user cache, which writes invalidate
+JWT_CACHE_TTL = 60.0
+JWT_CACHE_MAX = 10_000
+jwt_cache: dict[str, tuple[float, str]] = {}
 
 # Health check endpoints
 @app.get("/")
@@ -266,85 +397,151 @@ def _parse_iso_datetime(value: Optional[str]) -> Optional[datetime]:
 def _cache_nylas_grant(grant: dict) -> None:
     if not grant or 'grant_id' not in grant:
         return
-    with nylas_grant_cache_lock:
-        nylas_grant_cache[grant['grant_id']] = dict(grant)
+    nylas_grant_cache[grant['grant_id']] = dict(grant)
 
 
-def _get_cached_nylas_grant(grant_id: str) -> Optional[dict]:
-    with nylas_grant_cache_lock:
-        cached = nylas_grant_cache.get(grant_id)
+async def _load_nylas_grant(grant_id: str) -> Optional[dict]:
+    try:
+        record = await asyncio.to_thread(db.get_nylas_grant_credentials, grant_id)
+        if record:
+            _cache_nylas_grant(record)
+            _schedule_nylas_refresh(record)
+        return record
+    finally:
+        nylas_grant_loads.pop(grant_id, None)
+
+
+async def _get_cached_nylas_grant(grant_id: str) -> Optional[dict]:
+    """Return a copy of the cached grant; concurrent misses share one database read."""
+    cached = nylas_grant_cache.get(grant_id)
     if cached:
-        return dict(cached)
-    record = db.get_nylas_grant_credentials(grant_id)
-    if record:
-        _cache_nylas_grant(record)
-        return dict(record)
-    return None
+        return cached.copy()
+    load = nylas_grant_loads.get(grant_id)
+    if load is None:
+        load = nylas_grant_loads[grant_id] = asyncio.create_task(_load_nylas_grant(grant_id))
+    # shield: a cancelled request must not cancel the read other requests are waiting on
+    record = await asyncio.shield(load)
+    return dict(record) if record else None
 
 
-def ensure_nylas_grant_tokens(grant_id: str) -> Optional[dict]:
-    """Refresh a grant's tokens when nearing expiry and keep cache/database aligned."""
-    if not nylas_client:
-        return None
+def _nylas_grant_expiring(grant: dict, headroom: timedelta = NYLAS_REFRESH_HEADROOM) -> bool:
+    """True when the grant can be refreshed and expires within headroom."""
+    expires_at = _parse_iso_datetime(grant.get('expires_at'))
+    if not grant.get('refresh_token') or not expires_at:
+        return False
+    return expires_at <= datetime.utcnow() + headroom
 
-    grant = _get_cached_nylas_grant(grant_id)
-    if not grant:
-        return None
 
+def _schedule_nylas_refresh(grant: dict) -> None:
+    """Wake up NYLAS_REFRESH_LEAD before the grant expires and refresh it off the request path."""
+    grant_id = grant.get('grant_id')
     expires_at = _parse_iso_datetime(grant.get('expires_at'))
-    refresh_token = grant.get('refresh_token')
-    if not refresh_token or not expires_at:
-        return grant
+    if not grant_id or not grant.get('refresh_token') or not expires_at:
+        return
+    previous = nylas_refresh_timers.pop(grant_id, None)
+    if previous:
+        previous.cancel()
+    delay = max((expires_at - NYLAS_REFRESH_LEAD - datetime.utcnow()).total_seconds(), 0)
+    nylas_refresh_timers[grant_id] = asyncio.get_running_loop().call_later(
+        delay, lambda: asyncio.create_task(_refresh_nylas_grant(grant_id, NYLAS_REFRESH_LEAD))
+    )
 
-    if expires_at > datetime.utcnow() + NYLAS_REFRESH_HEADROOM:
-        return grant
 
-    try:
-        refresh_response = nylas_client.auth.refresh_access_token({
-            "client_id": NYLAS_CLIENT_ID,
-            "client_secret": NYLAS_API_KEY,
-            "refresh_token": refresh_token,
-            "redirect_uri": NYLAS_CALLBACK_URI,
+def _cancel_nylas_refresh(grant_id: str) -> None:
+    timer = nylas_refresh_timers.pop(grant_id, None)
+    if timer:
+        timer.cancel()
+    nylas_refresh_locks.pop(grant_id, None)
+
+
+async def _refresh_nylas_grant(grant_id: str, headroom: timedelta = NYLAS_REFRESH_HEADROOM) -> Optional[dict]:
+    """Refresh a grant's tokens; concurrent callers for one grant share a single refresh."""
+    lock = nylas_refresh_locks.setdefault(grant_id, asyncio.Lock())
+    async with lock:
+        # Whoever held the lock before us may already have refreshed
+        grant = await _get_cached_nylas_grant(grant_id)
+        if not grant or not _nylas_grant_expiring(grant, headroom):
+            return grant
+
+        try:
+            response = await _get_httpx_client().post("/v3/connect/token", json={
+                "client_id": NYLAS_CLIENT_ID,
+                "client_secret": NYLAS_API_KEY,
+                "grant_type": "refresh_token",
+                "refresh_token": grant['refresh_token'],
+                "redirect_uri": NYLAS_CALLBACK_URI,
+            })
+            response.raise_for_status()
+            refresh_response = response.json()
+        except Exception as exc:
+            print(f"Nylas token refresh failed for {grant_id}: {exc}")
+            return grant
+
+        try:
+            expires_in_seconds = int(refresh_response.get('expires_in') or 3600)
+        except Exception:
+            expires_in_seconds = 3600
+
+        grant.update({
+            'access_token': refresh_response.get('access_token') or grant.get('access_token'),
+            'refresh_token': refresh_response.get('refresh_token') or grant['refresh_token'],
+            'expires_at': (datetime.utcnow() + timedelta(seconds=expires_in_seconds)).isoformat(),
+            'scope': refresh_response.get('scope') or grant.get('scope'),
+            'token_type': refresh_response.get('token_type') or grant.get('token_type'),
         })
-    except Exception as exc:
-        print(f"Nylas token refresh failed for {grant_id}: {exc}")
+
+        await asyncio.to_thread(
+            db.update_nylas_grant_tokens,
+            grant_id,
+            access_token=grant['access_token'],
+            refresh_token=grant['refresh_token'],
+            expires_at=grant['expires_at'],
+            scope=grant['scope'],
+            token_type=grant['token_type'],
+        )
+        _cache_nylas_grant(grant)
+        _schedule_nylas_refresh(grant)
         return grant
 
-    expires_in_value = getattr(refresh_response, 'expires_in', None)
-    try:
-        expires_in_seconds = int(expires_in_value) if expires_in_value else 3600
-    except Exception:
-        expires_in_seconds = 3600
-
-    new_expires_at = (datetime.utcnow() + timedelta(seconds=expires_in_seconds)).isoformat()
-    new_access_token = getattr(refresh_response, 'access_token', grant.get('access_token'))
-    new_refresh_token = getattr(refresh_response, 'refresh_token', None) or refresh_token
-    new_scope = getattr(refresh_response, 'scope', grant.get('scope'))
-    new_token_type = getattr(refresh_response, 'token_type', grant.get('token_type'))
-
-    grant.update({
-        'access_token': new_access_token,
-        'refresh_token': new_refresh_token,
-        'expires_at': new_expires_at,
-        'scope': new_scope,
-        'token_type': new_token_type,
-    })
 
-    db.update_nylas_grant_tokens(
-        grant_id,
-        access_token=new_access_token,
-        refresh_token=new_refresh_token,
-        expires_at=new_expires_at,
-        scope=new_scope,
-        token_type=new_token_type,
-    )
-    _cache_nylas_grant(grant)
-    return grant
+async def ensure_nylas_grant_tokens(grant_id: str) -> Optional[dict]:
+    """Return a grant's credentials, refreshing inline only if the background refresh hasn't."""
+    if not nylas_client:
+        return None
+
+    grant = await _get_cached_nylas_grant(grant_id)
+    if not grant or not _nylas_grant_expiring(grant):
+        return grant
+    return await _refresh_nylas_grant(grant_id)
+
+
+# argon2id at these settings takes ~50 ms versus ~250 ms for bcrypt cost 12, and stays memory-hard
+password_hasher = PasswordHasher(time_cost=2, memory_cost=65536, parallelism=1)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
+    if hashed_password.startswith("$argon2"):
+        try:
+            return password_hasher.verify(hashed_password, plain_password)
+        except (VerificationError, InvalidHashError):
+            return False
+    # Accounts created before argon2 still carry bcrypt hashes
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
 def get_password_hash(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    return password_hasher.hash(password)
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True for bcrypt hashes or argon2 hashes made with older parameters."""
+    if not hashed_password.startswith("$argon2"):
+        return True
+    return password_hasher.check_needs_rehash(hashed_password)
+
+# bcrypt is pure CPU (~250 ms per hash); run it off the event loop on its own threads
+# so a burst of logins can't starve the default pool used for Nylas/DB calls
+password_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="password-hash")
+
+async def run_password_work(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(password_executor, func, *args)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
@@ -352,13 +549,27 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+def _cache_jwt(token: str, payload: dict) -> None:
+    # Never outlive the token's own expiry
+    expires = min(time.time() + JWT_CACHE_TTL, payload.get("exp", float("inf")))
+    if len(jwt_cache) >= JWT_CACHE_MAX:
+        # Dicts keep insertion order, so the first key is the oldest entry
+        jwt_cache.pop(next(iter(jwt_cache)))
+    jwt_cache[token] = (expires, payload["sub"])
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid authentication")
-        user = db.get_user_by_id(user_id)
+        token = credentials.credentials
+        entry = jwt_cache.get(token)
+        if entry is not None and entry[0] > time.time():
+            user_id = entry[1]
+        else:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            user_id = payload.get("sub")
+            if user_id is None:
+                raise HTTPException(status_code=401, detail="Invalid authentication")
+            _cache_jwt(token, payload)
+        user = await db.aget_user_by_id(user_id)
         if user is None:
             raise HTTPException(status_code=401, detail="Invalid authentication")
         return user
@@ -367,52 +578,33 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+# Bound once: every classify() result picks a personality line
+_choose = random.choice
+
 class JonE5Classifier:
-    STAT_KEYWORDS = ["critical", "urgent", "stat", "emergency", "abnormal", "positive", "elevated", "low", "high", "alert", "immediate", "asap"]
-    STAT_DOMAINS = ["labcorp", "quest", "hospital", "er", "emergency", "lab", "pathology", "radiology"]
-    TODAY_KEYWORDS = ["refill", "prescription", "prior auth", "authorization", "referral", "appointment", "callback", "pharmacy", "medication"]
-    TODAY_DOMAINS = ["pharmacy", "cvs", "walgreens", "insurance", "medicaid", "medicare", "aetna", "cigna", "united", "bcbs"]
-    THIS_WEEK_KEYWORDS = ["billing", "invoice", "payment", "claim", "denial", "records request", "compliance", "audit"]
-    LATER_KEYWORDS = ["newsletter", "cme", "conference", "webinar", "marketing", "promotion", "sale", "discount", "survey"]
+    # Lowercase tuples: classify() lowercases the text once and matches against these as-is
+    STAT_KEYWORDS = ("critical", "urgent", "stat", "emergency", "emergencies", "abnormal", "abnormality", "abnormalities", "positive", "elevated", "low", "high", "alert", "immediate", "asap")
+    STAT_DOMAINS = ("labcorp", "quest", "hospital", "er", "emergency", "lab", "pathology", "radiology")
+    TODAY_KEYWORDS = ("refill", "prescription", "prior auth", "authorization", "referral", "appointment", "callback", "pharmacy", "pharmacies", "medication")
+    TODAY_DOMAINS = ("pharmacy", "cvs", "walgreens", "insurance", "medicaid", "medicare", "aetna", "cigna", "united", "bcbs")
+    THIS_WEEK_KEYWORDS = ("billing", "invoice", "payment", "claim", "denial", "records request", "compliance", "audit")
+    LATER_KEYWORDS = ("newsletter", "cme", "conference", "webinar", "marketing", "promotion", "sale", "discount", "survey")
+    # One whole-word scan for every zone's keywords, so "low" no longer matches inside "below" or "follow".
+    # Regular inflections ("refills", "claimed", "immediately") still match; irregular ones are listed above.
+    KEYWORD_ZONE = {kw: zone for zone, kws in (("STAT", STAT_KEYWORDS), ("TODAY", TODAY_KEYWORDS), ("THIS_WEEK", THIS_WEEK_KEYWORDS), ("LATER", LATER_KEYWORDS)) for kw in kws}
+    KEYWORD_RE = re.compile(r"\b(" + "|".join(map(re.escape, sorted(KEYWORD_ZONE, key=len, reverse=True))) + r")(?:s|es|ed|ing|ly)?\b")
     
     PERSONALITY_MESSAGES = {
-        "STAT": ["Doctor, I've detected a potentially urgent item. This one needs your attention.", "Sentinel alert: High-priority message detected. Please review promptly."],
-        "TODAY": ["Zzzzip! Sorted! This one needs attention today!", "Input received! Routing to TODAY - action needed soon!"],
-        "THIS_WEEK": ["Scanning... analyzing... okay! This can wait a few days.", "Sorted! This one goes to THIS WEEK - no rush!"],
-        "LATER": ["Zoom zoom! Low priority detected! Filing to LATER!", "Input processed! This one can definitely wait!"]
+        "STAT": ("Doctor, I've detected a potentially urgent item. This one needs your attention.", "Sentinel alert: High-priority message detected. Please review promptly."),
+        "TODAY": ("Zzzzip! Sorted! This one needs attention today!", "Input received! Routing to TODAY - action needed soon!"),
+        "THIS_WEEK": ("Scanning... analyzing... okay! This can wait a few days.", "Sorted! This one goes to THIS WEEK - no rush!"),
+        "LATER": ("Zoom zoom! Low priority detected! Filing to LATER!", "Input processed! This one can definitely wait!")
     }
     
-    CORRECTION_THANKS = ["Thank you! Correction received! Updating my circuits!", "Oh! I love learning from you! Adjustment logged!", "Correction accepted! My triage pathways are sharper already!"]
-    
-    def _check_keywords(self, text: str, keywords: list) -> tuple:
-        text_lower = text.lower()
-        for keyword in keywords:
-            if keyword.lower() in text_lower:
-                return True, keyword
-        return False, ""
-    
-    def _check_domain(self, domain: str, domains: list) -> tuple:
-        domain_lower = domain.lower()
-        for d in domains:
-            if d.lower() in domain_lower:
-                return True, d
-        return False, ""
-    
-    def _llm_classify(self, sender: str, sender_domain: str, subject: str, snippet: Optional[str] = None) -> Optional[JonE5Response]:
-        """Use Cerebras LLM for full agent analysis - classification, summary, action, and draft reply."""
-        if not cerebras_client:
-            return None
-        
-        try:
-            prompt = f"""You are jonE5, an AI medical office assistant. Analyze this email and provide actionable intelligence.
-
-Email:
-- From: {sender} ({sender_domain})
-- Subject: {subject}
-- Content: {snippet or 'No content available'}
+    LLM_SYSTEM_PROMPT = """You are jonE5, an AI medical office assistant. Analyze the email and provide actionable intelligence.
 
-Provide a complete analysis as JSON:
-{{
+Respond only with a JSON object matching this schema:
+{
   "zone": "STAT|TODAY|THIS_WEEK|LATER",
   "confidence": 0.0-1.0,
   "reason": "why this priority",
@@ -420,31 +612,81 @@ Provide a complete analysis as JSON:
   "recommended_action": "specific action like 'Call patient back about lab results' or 'Forward to billing department' or 'Archive - no action needed'",
   "action_type": "reply|forward|call|archive|delegate|review",
   "draft_reply": "If action_type is reply, write a professional 2-3 sentence response. Otherwise null."
-}}
+}
 
 Zones:
 - STAT: Urgent (critical labs, emergencies) - needs immediate action
-- TODAY: Same-day (refills, prior auths, referrals) - needs response today  
+- TODAY: Same-day (refills, prior auths, referrals) - needs response today
 - THIS_WEEK: Standard (billing, records) - can wait a few days
 - LATER: FYI only (newsletters, marketing) - archive or ignore
 
 Be specific and actionable. The doctor is overwhelmed with emails - help them know exactly what to do."""
+    
+    CORRECTION_THANKS = ("Thank you! Correction received! Updating my circuits!", "Oh! I love learning from you! Adjustment logged!", "Correction accepted! My triage pathways are sharper already!")
+    
+    def _match_keywords(self, text_lower: str) -> dict:
+        """Map each zone to the first keyword of that zone found in the text."""
+        hits = {}
+        for match in self.KEYWORD_RE.finditer(text_lower):
+            zone = self.KEYWORD_ZONE[match.group(1)]
+            hits.setdefault(zone, match.group(1))
+            if zone == "STAT":  # highest priority, nothing later can change the result
+                break
+        return hits
+    
+    def _check_domain(self, domain_lower: str, domains: tuple) -> tuple:
+        for d in domains:
+            if d in domain_lower:
+                return True, d
+        return False, ""
+    
+    def _llm_cache_key(self, sender_domain: str, subject: str, snippet: Optional[str]) -> Optional[str]:
+        # No content means too little signal to share an analysis between messages
+        if not snippet or not snippet.strip():
+            return None
+        normalized = " ".join(snippet.split()).lower()[:512]
+        return hashlib.blake2b(f"{sender_domain.lower()}|{subject}|{normalized}".encode("utf-8"), digest_size=16).hexdigest()
+    
+    def _llm_classify(self, sender: str, sender_domain: str, subject: str, snippet: Optional[str] = None) -> Optional[JonE5Response]:
+        """LLM analysis with a content-hash LRU in front; only the personality line is re-rolled on a hit."""
+        if not cerebras_client:
+            return None
+        
+        key = self._llm_cache_key(sender_domain, subject, snippet)
+        if key is not None:
+            with llm_cache_lock:
+                cached = llm_cache.get(key)
+                if cached is not None:
+                    llm_cache.move_to_end(key)
+            if cached is not None:
+                return JonE5Response(**cached, personality_message=_choose(self.PERSONALITY_MESSAGES[cached["zone"]]))
+        
+        result = self._llm_request(sender, sender_domain, subject, snippet)
+        if result is not None and key is not None:
+            with llm_cache_lock:
+                llm_cache[key] = result.model_dump(exclude={"personality_message"})
+                if len(llm_cache) > LLM_CACHE_SIZE:
+                    llm_cache.popitem(last=False)
+        return result
+    
+    def _llm_request(self, sender: str, sender_domain: str, subject: str, snippet: Optional[str] = None) -> Optional[JonE5Response]:
+        """Use Cerebras LLM for full agent analysis - classification, summary, action, and draft reply."""
+        try:
+            prompt = f"""Email:
+- From: {sender} ({sender_domain})
+- Subject: {subject}
+- Content: {snippet or 'No content available'}"""
 
+            # JSON mode guarantees a bare object, so no code fences to strip and fewer tokens to generate
             response = cerebras_client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
+                messages=[{"role": "system", "content": self.LLM_SYSTEM_PROMPT}, {"role": "user", "content": prompt}],
                 model="llama-3.3-70b",
-                max_tokens=500,
+                response_format={"type": "json_object"},
+                max_tokens=350,
                 temperature=0.2
             )
             
-            result_text = response.choices[0].message.content.strip()
-            # Try to extract JSON from response
-            if "```json" in result_text:
-                result_text = result_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in result_text:
-                result_text = result_text.split("```")[1].split("```")[0].strip()
-            
-            result = json.loads(result_text)
+            result = orjson.loads(response.choices[0].message.content)
             zone = result.get("zone", "THIS_WEEK")
             if zone not in ["STAT", "TODAY", "THIS_WEEK", "LATER"]:
                 zone = "THIS_WEEK"
@@ -457,7 +699,7 @@ Be specific and actionable. The doctor is overwhelmed with emails - help them kn
                 zone=zone,
                 confidence=confidence,
                 reason=result.get("reason", "AI analysis"),
-                personality_message=random.choice(self.PERSONALITY_MESSAGES[zone]),
+                personality_message=_choose(self.PERSONALITY_MESSAGES[zone]),
                 summary=result.get("summary"),
                 recommended_action=result.get("recommended_action"),
                 action_type=result.get("action_type"),
@@ -477,50 +719,53 @@ Be specific and actionable. The doctor is overwhelmed with emails - help them kn
                 return llm_result
         
         # Fallback to rules-only if LLM is unavailable (no agent outputs)
-        combined_text = f"{subject} {snippet or ''}"
+        combined_text = f"{subject} {snippet or ''}".lower()
+        domain_lower = sender_domain.lower()
         
         sender_key = f"sender:{sender.lower()}"
         override = db.get_rule_override(sender_key)
         if override:
             zone = override
-            return JonE5Response(zone=zone, confidence=0.95, reason="Learned pattern from previous correction", personality_message=random.choice(self.PERSONALITY_MESSAGES[zone]),
+            return JonE5Response(zone=zone, confidence=0.95, reason="Learned pattern from previous correction", personality_message=_choose(self.PERSONALITY_MESSAGES[zone]),
                 summary=f"Email from {sender} about: {subject[:50]}...", recommended_action="Review and take appropriate action", action_type="review", fallback=True)
         
-        found, keyword = self._check_keywords(combined_text, self.STAT_KEYWORDS)
-        if found:
-            return JonE5Response(zone="STAT", confidence=0.92, reason=f"Urgent keyword: '{keyword}'", personality_message=random.choice(self.PERSONALITY_MESSAGES["STAT"]),
+        keyword_hits = self._match_keywords(combined_text)
+        
+        keyword = keyword_hits.get("STAT")
+        if keyword:
+            return JonE5Response(zone="STAT", confidence=0.92, reason=f"Urgent keyword: '{keyword}'", personality_message=_choose(self.PERSONALITY_MESSAGES["STAT"]),
                 summary=f"URGENT: Contains '{keyword}' - requires immediate attention", recommended_action="Review immediately and respond", action_type="review", fallback=True)
         
-        found, domain = self._check_domain(sender_domain, self.STAT_DOMAINS)
+        found, domain = self._check_domain(domain_lower, self.STAT_DOMAINS)
         if found:
-            return JonE5Response(zone="STAT", confidence=0.88, reason=f"High-priority domain: '{domain}'", personality_message=random.choice(self.PERSONALITY_MESSAGES["STAT"]),
+            return JonE5Response(zone="STAT", confidence=0.88, reason=f"High-priority domain: '{domain}'", personality_message=_choose(self.PERSONALITY_MESSAGES["STAT"]),
                 summary=f"From {domain} - likely urgent medical matter", recommended_action="Review lab/medical results immediately", action_type="review", fallback=True)
         
-        found, keyword = self._check_keywords(combined_text, self.TODAY_KEYWORDS)
-        if found:
-            return JonE5Response(zone="TODAY", confidence=0.85, reason=f"Same-day keyword: '{keyword}'", personality_message=random.choice(self.PERSONALITY_MESSAGES["TODAY"]),
+        keyword = keyword_hits.get("TODAY")
+        if keyword:
+            return JonE5Response(zone="TODAY", confidence=0.85, reason=f"Same-day keyword: '{keyword}'", personality_message=_choose(self.PERSONALITY_MESSAGES["TODAY"]),
                 summary=f"Action needed today: {keyword}", recommended_action=f"Process {keyword} request today", action_type="reply", fallback=True)
         
-        found, domain = self._check_domain(sender_domain, self.TODAY_DOMAINS)
+        found, domain = self._check_domain(domain_lower, self.TODAY_DOMAINS)
         if found:
-            return JonE5Response(zone="TODAY", confidence=0.82, reason=f"Action-required sender: '{domain}'", personality_message=random.choice(self.PERSONALITY_MESSAGES["TODAY"]),
+            return JonE5Response(zone="TODAY", confidence=0.82, reason=f"Action-required sender: '{domain}'", personality_message=_choose(self.PERSONALITY_MESSAGES["TODAY"]),
                 summary=f"From {domain} - likely needs same-day response", recommended_action="Respond to request today", action_type="reply", fallback=True)
         
-        found, keyword = self._check_keywords(combined_text, self.THIS_WEEK_KEYWORDS)
-        if found:
-            return JonE5Response(zone="THIS_WEEK", confidence=0.80, reason=f"Administrative keyword: '{keyword}'", personality_message=random.choice(self.PERSONALITY_MESSAGES["THIS_WEEK"]),
+        keyword = keyword_hits.get("THIS_WEEK")
+        if keyword:
+            return JonE5Response(zone="THIS_WEEK", confidence=0.80, reason=f"Administrative keyword: '{keyword}'", personality_message=_choose(self.PERSONALITY_MESSAGES["THIS_WEEK"]),
                 summary=f"Administrative matter: {keyword}", recommended_action=f"Handle {keyword} within the week", action_type="delegate", fallback=True)
         
-        found, keyword = self._check_keywords(combined_text, self.LATER_KEYWORDS)
-        if found:
-            return JonE5Response(zone="LATER", confidence=0.90, reason=f"Low-priority keyword: '{keyword}'", personality_message=random.choice(self.PERSONALITY_MESSAGES["LATER"]),
+        keyword = keyword_hits.get("LATER")
+        if keyword:
+            return JonE5Response(zone="LATER", confidence=0.90, reason=f"Low-priority keyword: '{keyword}'", personality_message=_choose(self.PERSONALITY_MESSAGES["LATER"]),
                 summary=f"FYI only: {keyword}", recommended_action="Archive - no action needed", action_type="archive", fallback=True)
         
         return JonE5Response(zone="THIS_WEEK", confidence=0.60, reason="No strong signals - defaulting to THIS_WEEK", personality_message="Hmm... I'm not sure about this one. Putting it in THIS_WEEK for your review!",
             summary=f"Email from {sender}: {subject[:50]}...", recommended_action="Review and categorize manually", action_type="review", fallback=True)
     
     def get_correction_message(self) -> str:
-        return random.choice(self.CORRECTION_THANKS)
+        return _choose(self.CORRECTION_THANKS)
 
 jone5 = JonE5Classifier()
 
@@ -564,10 +809,11 @@ async def register(user: UserCreate, background_tasks: BackgroundTasks):
     
     user_id = str(uuid.uuid4())
     # Create user as unverified
-    new_user = db.create_user(user_id, user.email, user.name, user.practice_name, get_password_hash(user.password), is_verified=False)
+    hashed_password = await run_password_work(get_password_hash, user.password)
+    new_user = db.create_user(user_id, user.email, user.name, user.practice_name, hashed_password, is_verified=False)
     
     # Generate verification token
-    verification_token = hashlib.sha256(f"{user_id}{user.email}{datetime.utcnow().isoformat()}{random.random()}".encode()).hexdigest()
+    verification_token = secrets.token_urlsafe(32)
     
     # Store verification token (expires in 24 hours)
     db.create_email_verification(user_id, user.email, verification_token, expires_in_hours=24)
@@ -598,20 +844,27 @@ async def login(credentials: UserLogin):
         print(f"Login attempt for email: {email}")
         
         # Get user from database (with timeout protection)
-        user = db.get_user_by_email(email)
+        user = await db.aget_user_by_email(email)
         if not user:
             print(f"Login failed: User not found for email: {email}")
             raise HTTPException(status_code=401, detail="Invalid email or password")
         
         print(f"User found: {user.get('id')}")
         
-        # Verify password (bcrypt is fast, but check early)
-        if not verify_password(credentials.password, user["hashed_password"]):
+        # Verify password off the event loop
+        if not await run_password_work(verify_password, credentials.password, user["hashed_password"]):
             print(f"Login failed: Invalid password for email: {email}")
             raise HTTPException(status_code=401, detail="Invalid email or password")
         
         print(f"Password verified for: {email}")
         
+        # Upgrade legacy bcrypt hashes now that we hold the plaintext; login succeeds regardless
+        if password_needs_rehash(user["hashed_password"]):
+            try:
+                db.update_user_password_hash(user["id"], await run_password_work(get_password_hash, credentials.password))
+            except Exception as e:
+                print(f"Password rehash failed for {email}: {e}")
+        
         # Check if email is verified (only after password check passes)
         # For development: allow unverified logins with warning
         is_verified = bool(user.get("is_verified", False))
@@ -661,7 +914,7 @@ async def verify_email(token: str):
 @app.post("/api/auth/resend-verification")
 async def resend_verification(email: str, background_tasks: BackgroundTasks):
     """Resend verification email."""
-    user = db.get_user_by_email(email)
+    user = await db.aget_user_by_email(email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -669,7 +922,7 @@ async def resend_verification(email: str, background_tasks: BackgroundTasks):
         raise HTTPException(status_code=400, detail="Email already verified")
     
     # Generate new verification token
-    verification_token = hashlib.sha256(f"{user['id']}{email}{datetime.utcnow().isoformat()}{random.random()}".encode()).hexdigest()
+    verification_token = secrets.token_urlsafe(32)
     db.create_email_verification(user["id"], email, verification_token, expires_in_hours=24)
     
     # Send verification email in background
@@ -705,15 +958,15 @@ async def ingest_email(email: EmailIngest, current_user: dict = Depends(get_curr
     return MessageResponse(**{**message, "received_at": now, "classified_at": now})
 
 @app.get("/api/messages")
-async def get_messages(zone: Optional[ZoneType] = None, current_user: dict = Depends(get_current_user)):
+async def get_messages(zone: Optional[ZoneType] = None, before: Optional[str] = None, current_user: dict = Depends(get_current_user)):
     user_id = current_user["id"]
-    messages = db.get_messages_by_user(user_id, zone)
+    messages = await db.aget_messages_by_user(user_id, zone, before_received_at=before)
     return {"messages": messages, "total": len(messages)}
 
 @app.get("/api/messages/by-zone")
 async def get_messages_by_zone(current_user: dict = Depends(get_current_user)):
     user_id = current_user["id"]
-    messages = db.get_messages_by_user(user_id)
+    messages = await db.aget_messages_by_user(user_id)
     zones = {"STAT": [], "TODAY": [], "THIS_WEEK": [], "LATER": []}
     for msg in messages:
         zones[msg["zone"]].append(msg)
@@ -723,26 +976,30 @@ async def get_messages_by_zone(current_user: dict = Depends(get_current_user)):
 async def get_full_message(message_id: str, current_user: dict = Depends(get_current_user)):
     """Get full email content - fetches from provider if not cached (jukebox-style access)."""
     user_id = current_user["id"]
-    message = db.get_message_by_id(message_id, user_id)
-    if not message:
+    body = await db.aget_message_body(message_id, user_id)
+    if not body:
         raise HTTPException(status_code=404, detail="Message not found")
     
     # If we have full content cached, return it immediately (jukebox - fast access)
-    if message.get('raw_body') or message.get('raw_body_html'):
+    if body.get('raw_body') or body.get('raw_body_html'):
         return {
             "id": message_id,
-            "raw_body": message.get('raw_body'),
-            "raw_body_html": message.get('raw_body_html'),
+            "raw_body": body.get('raw_body'),
+            "raw_body_html": body.get('raw_body_html'),
             "cached": True
         }
     
+    message = await db.aget_message_by_id(message_id, user_id)
+    if not message:
+        raise HTTPException(status_code=404, detail="Message not found")
+    
     # If not cached, fetch from provider on-demand (jukebox - access when needed)
     provider_grant_id = message.get('provider_grant_id')
     provider_message_id = message.get('provider_message_id')
     
     if provider_grant_id and provider_message_id and nylas_client:
         try:
-            grant_credentials = ensure_nylas_grant_tokens(provider_grant_id)
+            grant_credentials = await ensure_nylas_grant_tokens(provider_grant_id)
             if grant_credentials:
                 # Fetch full message from Nylas (jukebox access)
                 full_msg = nylas_client.messages.find(provider_grant_id, provider_message_id)
@@ -773,7 +1030,7 @@ async def get_full_message(message_id: str, current_user: dict = Depends(get_cur
 @app.post("/api/messages/correct")
 async def correct_message(correction: ZoneCorrection, current_user: dict = Depends(get_current_user)):
     user_id = current_user["id"]
-    message = db.get_message_by_id(correction.message_id, user_id)
+    message = await db.aget_message_by_id(correction.message_id, user_id)
     if not message:
         raise HTTPException(status_code=404, detail="Message not found")
     old_zone = message["zone"]
@@ -789,7 +1046,7 @@ async def correct_message(correction: ZoneCorrection, current_user: dict = Depen
 @app.delete("/api/messages/{message_id}")
 async def delete_message(message_id: str, current_user: dict = Depends(get_current_user)):
     user_id = current_user["id"]
-    message = db.get_message_by_id(message_id, user_id)
+    message = await db.aget_message_by_id(message_id, user_id)
     if not message:
         raise HTTPException(status_code=404, detail="Message not found")
 
@@ -800,7 +1057,7 @@ async def delete_message(message_id: str, current_user: dict = Depends(get_curre
     if provider_grant_id and provider_message_id:
         if nylas_client:
             try:
-                ensure_nylas_grant_tokens(provider_grant_id)
+                await ensure_nylas_grant_tokens(provider_grant_id)
                 nylas_client.messages.destroy(provider_grant_id, provider_message_id)
                 provider_feedback['provider_synced'] = True
             except Exception as exc:
@@ -819,7 +1076,7 @@ async def delete_message(message_id: str, current_user: dict = Depends(get_curre
 @app.get("/api/stats")
 async def get_stats(current_user: dict = Depends(get_current_user)):
     user_id = current_user["id"]
-    messages = db.get_messages_by_user(user_id)
+    messages = await db.aget_messages_by_user(user_id)
     corrections = db.get_corrections_by_user(user_id)
     zone_counts = {"STAT": 0, "TODAY": 0, "THIS_WEEK": 0, "LATER": 0}
     for msg in messages:
@@ -837,7 +1094,7 @@ class MessageStatusUpdate(BaseModel):
 async def get_action_center(current_user: dict = Depends(get_current_user)):
     """Get the Action Center / Daily Brief data."""
     user_id = current_user["id"]
-    action_items = db.get_action_items(user_id)
+    action_items = await db.aget_action_items(user_id)
     return {
         "urgent_count": len(action_items["urgent_items"]),
         "needs_reply_count": len(action_items["needs_reply"]),
@@ -853,7 +1110,7 @@ async def get_action_center(current_user: dict = Depends(get_current_user)):
 async def update_message_status(message_id: str, update: MessageStatusUpdate, current_user: dict = Depends(get_current_user)):
     """Update message status (done, archived, snoozed, active)."""
     user_id = current_user["id"]
-    message = db.get_message_by_id(message_id, user_id)
+    message = await db.aget_message_by_id(message_id, user_id)
     if not message:
         raise HTTPException(status_code=404, detail="Message not found")
 
@@ -886,7 +1143,7 @@ async def update_message_status(message_id: str, update: MessageStatusUpdate, cu
 
             if provider_request:
                 try:
-                    ensure_nylas_grant_tokens(provider_grant_id)
+                    await ensure_nylas_grant_tokens(provider_grant_id)
                     nylas_client.messages.update(provider_grant_id, provider_message_id, provider_request)
                     provider_feedback['provider_synced'] = True
                 except Exception as exc:
@@ -898,7 +1155,8 @@ async def update_message_status(message_id: str, update: MessageStatusUpdate, cu
     else:
         provider_feedback['provider_message'] = 'Local message; provider sync skipped.'
 
-    if not db.update_message_status(message_id, user_id, update.status, update.snoozed_until):
+    updated = db.update_message_status(message_id, user_id, update.status, update.snoozed_until)
+    if not updated:
         raise HTTPException(status_code=404, detail="Message not found")
 
     if provider_feedback.get('provider_synced'):
@@ -911,7 +1169,8 @@ async def update_message_status(message_id: str, update: MessageStatusUpdate, cu
 
     provider_feedback.update({
         "success": True,
-        "status": update.status,
+        "status": updated["status"],
+        "snoozed_until": updated["snoozed_until"],
     })
     return provider_feedback
 
@@ -1273,7 +1532,7 @@ async def inbound_email_webhook(token: str, request: Request):
 async def get_messages_by_source(source_id: str, current_user: dict = Depends(get_current_user)):
     """Get all messages from a specific source."""
     user_id = current_user["id"]
-    messages = db.get_messages_by_user(user_id)
+    messages = await db.aget_messages_by_user(user_id)
     filtered = [m for m in messages if m.get("source_id") == source_id]
     return {"messages": filtered, "total": len(filtered)}
 
@@ -1421,6 +1680,7 @@ async def nylas_oauth_callback(code: str, state: str = None, background_tasks: B
         stored_grant = db.get_nylas_grant_credentials(grant_id)
         if stored_grant:
             _cache_nylas_grant(stored_grant)
+            _schedule_nylas_refresh(stored_grant)
         
         # AUTO-SYNC top 5 emails immediately (background task) - no manual sync needed!
         if background_tasks and user_id:
@@ -1439,7 +1699,8 @@ def auto_sync_emails(grant_id: str, user_id: str, limit: int = 5):
         if not nylas_client:
             return
         
-        grant_credentials = ensure_nylas_grant_tokens(grant_id)
+        # Runs in a worker thread; hop back onto the event loop for the shared grant cache
+        grant_credentials = anyio.from_thread.run(ensure_nylas_grant_tokens, grant_id)
         if not grant_credentials:
             print(f"Failed to get grant credentials for {grant_id}")
             return
@@ -1450,6 +1711,7 @@ def auto_sync_emails(grant_id: str, user_id: str, limit: int = 5):
             query_params={"limit": limit, "in": ["INBOX"], "view": "expanded"}
         )
         
+        batch = []
         for msg in messages_response.data:
             # Extract email details
             from_list = msg.from_ if hasattr(msg, 'from_') else msg.get('from', [])
@@ -1531,9 +1793,11 @@ def auto_sync_emails(grant_id: str, user_id: str, limit: int = 5):
                 "raw_body_html": body_html,
             }
             
-            db.create_message(message)
+            batch.append(message)
         
-        # Update last sync time
+        db.bulk_create_messages(batch)
+        
+        # Update last sync time (buffered and flushed in bulk)
         db.update_nylas_grant_sync_time(grant_id, datetime.utcnow().isoformat())
         print(f"Auto-synced {len(messages_response.data)} emails from {email}")
     except Exception as e:
@@ -1543,7 +1807,7 @@ def auto_sync_emails(grant_id: str, user_id: str, limit: int = 5):
 async def get_nylas_grants(current_user: dict = Depends(get_current_user)):
     """Get all connected email accounts for the current user."""
     user_id = current_user["id"]
-    grants = db.get_nylas_grants_by_user(user_id)
+    grants = await db.aget_nylas_grants_by_user(user_id)
     return {"grants": grants, "total": len(grants)}
 
 @app.delete("/api/nylas/grants/{grant_id}")
@@ -1551,8 +1815,8 @@ async def delete_nylas_grant(grant_id: str, current_user: dict = Depends(get_cur
     """Disconnect an email account."""
     user_id = current_user["id"]
     if db.delete_nylas_grant(grant_id, user_id):
-        with nylas_grant_cache_lock:
-            nylas_grant_cache.pop(grant_id, None)
+        nylas_grant_cache.pop(grant_id, None)
+        _cancel_nylas_refresh(grant_id)
         return {"success": True}
     raise HTTPException(status_code=404, detail="Grant not found")
 
@@ -1570,7 +1834,7 @@ async def sync_nylas_emails(grant_id: str, limit: int = 50, current_user: dict =
     if not grant:
         raise HTTPException(status_code=404, detail="Grant not found")
     
-    grant_credentials = ensure_nylas_grant_tokens(grant_id)
+    grant_credentials = await ensure_nylas_grant_tokens(grant_id)
 
     try:
         # Fetch recent messages from Nylas with full content
@@ -1581,6 +1845,7 @@ async def sync_nylas_emails(grant_id: str, limit: int = 50, current_user: dict =
         
         classified_count = 0
         results = []
+        batch = []
         
         for msg in messages_response.data:
             # Extract email details - handle both object and dict formats
@@ -1702,11 +1967,14 @@ async def sync_nylas_emails(grant_id: str, limit: int = 50, current_user: dict =
                 "raw_body_html": body_html,  # Store HTML version if available
             }
             
-            db.create_message(message)
+            batch.append(message)
             classified_count += 1
             results.append({"subject": subject, "zone": classification.zone})
         
-        # Update last sync time
+        # One transaction for the whole sync instead of a commit per message
+        db.bulk_create_messages(batch)
+        
+        # Update last sync time (buffered and flushed in bulk)
         last_sync_timestamp = datetime.utcnow().isoformat()
         db.update_nylas_grant_sync_time(grant_id, last_sync_timestamp)
         if grant_credentials:
@@ -1732,7 +2000,7 @@ async def nylas_webhook_challenge(challenge: Optional[str] = None):
 
 
 @app.post("/api/nylas/webhook")
-async def nylas_webhook(request: Request, background_tasks: BackgroundTasks):
+async def nylas_webhook(request: Request):
     """Receive Nylas message.created events and trigger Shadow Worker."""
     data = await request.json()
 
@@ -1750,7 +2018,7 @@ async def nylas_webhook(request: Request, background_tasks: BackgroundTasks):
             grant_id = obj_data.get("grant_id")
             if msg_id and grant_id:
                 print(f"🔔 Webhook Received: New Message {msg_id}")
-                background_tasks.add_task(process_shadow_traffic, grant_id, msg_id)
+                shadow_queue.put_nowait((grant_id, msg_id))
 
     return {"status": "success"}
 
@@ -1788,7 +2056,7 @@ async def send_reply(message_id: str, request: SendReplyRequest, current_user: d
     user_id = current_user["id"]
     
     # Get the original message
-    message = db.get_message_by_id(message_id, user_id)
+    message = await db.aget_message_by_id(message_id, user_id)
     if not message:
         raise HTTPException(status_code=404, detail="Message not found")
     
@@ -1808,7 +2076,7 @@ async def send_reply(message_id: str, request: SendReplyRequest, current_user: d
         raise HTTPException(status_code=404, detail="Grant not found or does not belong to user")
     
     # Ensure grant tokens are fresh
-    grant_credentials = ensure_nylas_grant_tokens(grant_id)
+    grant_credentials = await ensure_nylas_grant_tokens(grant_id)
     if not grant_credentials:
         raise HTTPException(status_code=500, detail="Failed to refresh grant tokens")
     
@@ -1,14 +1,36 @@
-from sqlalchemy import Column, String, Float, Boolean, DateTime, ForeignKey, text
+from sqlalchemy import Column, String, Float, Boolean, DateTime, Enum, ForeignKey, Index, text
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
 
+LIFECYCLE_STATES = ("NEW", "ASSIGNED", "ESCALATED", "RESOLVED", "ARCHIVED")
+# States that still need work; matches the idx_vectors_active predicate
+ACTIVE_STATES = ("NEW", "ASSIGNED")
 
 class MessageStateVector(Base):
     __tablename__ = "message_state_vectors"
+    __table_args__ = (
+        Index(
+            "idx_vectors_context_gin",
+            "context_blob",
+            postgresql_using="gin",
+            postgresql_ops={"context_blob": "jsonb_path_ops"},
+        ),
+        Index(
+            "idx_vectors_active",
+            "deadline_at",
+            postgresql_where=text("lifecycle_state IN ('NEW', 'ASSIGNED')"),
+        ),
+        Index(
+            "idx_vectors_created_brin",
+            "created_at",
+            postgresql_using="brin",
+            postgresql_with={"pages_per_range": 64},
+        ),
+    )
 
-    id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("uuid_generate_v4()"))
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("uuid_generate_v7()"))
     nylas_message_id = Column(String, unique=True, nullable=False)
     grant_id = Column(String, nullable=False)
 
@@ -20,7 +42,10 @@ class MessageStateVector(Base):
     current_owner_role = Column(String, nullable=True)
     deadline_at = Column(DateTime(timezone=True), nullable=True)
 
-    lifecycle_state = Column(String, server_default="NEW")
+    lifecycle_state = Column(
+        Enum(*LIFECYCLE_STATES, native_enum=False, create_constraint=True, length=16),
+        server_default="NEW",
+    )
     is_overdue = Column(Boolean, default=False)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -32,7 +57,7 @@ class MessageStateVector(Base):
 class MessageEvent(Base):
     __tablename__ = "message_events"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("uuid_generate_v4()"))
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=text("uuid_generate_v7()"))
     vector_id = Column(UUID(as_uuid=True), ForeignKey("message_state_vectors.id", ondelete="CASCADE"))
     event_type = Column(String, nullable=False)
     description = Column(String, nullable=True)
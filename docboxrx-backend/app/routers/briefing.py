@@ -7,7 +7,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from app.database import get_db
-from app.models.state_vector import MessageStateVector
+from app.models.state_vector import ACTIVE_STATES, MessageStateVector
 
 router = APIRouter(prefix="/api/briefing", tags=["Briefing"])
 
@@ -36,7 +36,7 @@ async def get_daily_deck(role: str = "lead_doctor", db: AsyncSession = Depends(g
         select(MessageStateVector)
         .where(
             MessageStateVector.current_owner_role == role,
-            MessageStateVector.lifecycle_state.in_(["NEW", "ASSIGNED"]),
+            MessageStateVector.lifecycle_state.in_(ACTIVE_STATES),
         )
         .order_by(MessageStateVector.risk_score.desc(), MessageStateVector.deadline_at.asc())
         .limit(20)
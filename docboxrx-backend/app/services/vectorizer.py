@@ -1,8 +1,8 @@
-import json
 import os
 from datetime import datetime, timedelta
-from typing import Dict, Any
+from typing import Dict, Any, List
 
+import orjson
 from pydantic import BaseModel
 from cerebras.cloud.sdk import Cerebras
 import asyncio
@@ -63,7 +63,7 @@ OUTPUT JSON ONLY. NO MARKDOWN.
 
         try:
             content = await asyncio.to_thread(self._call_llm, prompt)
-            vector_data = json.loads(content)
+            vector_data = orjson.loads(content)
 
             hours = vector_data.get("suggested_deadline_hours", 24)
             deadline = datetime.now() + timedelta(hours=hours)
@@ -92,5 +92,9 @@ OUTPUT JSON ONLY. NO MARKDOWN.
                 "lifecycle_state": "NEW",
             }
 
+    async def vectorize_email_batch(self, emails: List[EmailInput]) -> List[Dict[str, Any]]:
+        """Vectorize emails concurrently; results keep input order."""
+        return list(await asyncio.gather(*[self.vectorize_email(email) for email in emails]))
+
 
 vectorizer = VectorizerService()
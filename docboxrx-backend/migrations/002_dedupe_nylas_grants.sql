@@ -0,0 +1,28 @@
+-- One-off cleanup before the unique index on nylas_grants(grant_id).
+--
+-- create_nylas_grant upserts ON CONFLICT (grant_id), so init_db creates
+-- idx_nylas_grants_grant_id_unique, and that fails while any grant_id has more
+-- than one row. This keeps the newest row per grant_id (ties broken by id) and
+-- deletes the rest, including rows whose user_id differs.
+--
+-- Review the preview first. The DELETE lists every row it removes.
+
+-- Preview: the rows that would be deleted
+SELECT older.id, older.grant_id, older.user_id, older.email, older.created_at
+FROM nylas_grants older
+JOIN nylas_grants newer ON newer.grant_id = older.grant_id
+    AND (newer.created_at > older.created_at OR (newer.created_at = older.created_at AND newer.id > older.id))
+ORDER BY older.grant_id, older.created_at;
+
+BEGIN;
+
+DELETE FROM nylas_grants WHERE id IN (
+    SELECT older.id FROM nylas_grants older
+    JOIN nylas_grants newer ON newer.grant_id = older.grant_id
+        AND (newer.created_at > older.created_at OR (newer.created_at = older.created_at AND newer.id > older.id))
+)
+RETURNING id, grant_id, user_id, email, created_at;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_nylas_grants_grant_id_unique ON nylas_grants(grant_id);
+
+COMMIT;
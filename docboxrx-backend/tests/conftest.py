@@ -0,0 +1,46 @@
+"""Run the suite against a throwaway SQLite database, never the one in .env."""
+import os
+import tempfile
+import uuid
+
+import pytest
+
+# Must happen before any app module is imported: app.db and app.database read these at import time,
+# and load_dotenv never overrides variables that are already set
+_test_dir = tempfile.mkdtemp(prefix="docboxrx-tests-")
+os.environ["DATABASE_PATH"] = os.path.join(_test_dir, "test.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.environ['DATABASE_PATH']}"
+os.environ.pop("DATABASE_READ_URL", None)
+os.environ["SECRET_KEY"] = "test-secret-key-for-the-docboxrx-suite"
+os.environ["NYLAS_API_KEY"] = "test-nylas-key"
+os.environ["NYLAS_CLIENT_ID"] = "test-nylas-client"
+# No LLM: jonE5 falls back to its keyword rules
+os.environ["CEREBRAS_API_KEY"] = ""
+
+from app import db  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    db.init_db()
+    # Account used by test_login.py
+    if db.get_user_by_email("testuser@example.com") is None:
+        from app.main import get_password_hash
+        db.create_user({
+            "id": str(uuid.uuid4()),
+            "email": "testuser@example.com",
+            "name": "Test User",
+            "hashed_password": get_password_hash("testpass"),
+        })
+
+
+@pytest.fixture
+def user():
+    """A fresh user row, so tests don't see each other's data."""
+    user_id = str(uuid.uuid4())
+    return db.create_user({
+        "id": user_id,
+        "email": f"{user_id}@example.com",
+        "name": "Dr. Test",
+        "hashed_password": "unused",
+    })
@@ -0,0 +1,54 @@
+import pytest
+
+from app.main import jone5
+
+
+def classify(subject: str, snippet: str = "", sender: str = "office@example.com"):
+    return jone5.classify(sender, sender.split("@", 1)[1], subject, snippet)
+
+
+def test_stat_keyword_beats_an_earlier_today_keyword():
+    result = classify("Refill request", "Potassium result is critical, please call")
+    assert result.zone == "STAT"
+    assert "critical" in result.reason
+
+
+def test_today_keyword_beats_an_earlier_later_keyword():
+    result = classify("Newsletter", "Also: prior auth needed for Mrs. Smith")
+    assert result.zone == "TODAY"
+
+
+def test_stat_domain_beats_a_today_keyword():
+    result = classify("Appointment reminder", sender="results@labcorp.com")
+    assert result.zone == "STAT"
+    assert "labcorp" in result.reason
+
+
+@pytest.mark.parametrize("subject", [
+    "Results below range, please follow up",  # "low" inside below/follow
+    "Status of your account",  # "stat" inside status
+    "Flowsheet attached",
+])
+def test_keywords_do_not_match_inside_other_words(subject):
+    assert classify(subject).zone == "THIS_WEEK"
+    assert classify(subject).reason.startswith("No strong signals")
+
+
+@pytest.mark.parametrize("subject, zone, keyword", [
+    ("Refills ready for pickup", "TODAY", "refill"),
+    ("Two claims were denied", "THIS_WEEK", "claim"),
+    ("Upcoming webinars this spring", "LATER", "webinar"),
+    ("Please respond immediately", "STAT", "immediate"),
+    ("Urgently need a callback", "STAT", "urgent"),
+    ("Emergencies over the weekend", "STAT", "emergencies"),
+    ("Local pharmacies closed Monday", "TODAY", "pharmacies"),
+    ("Records requests pending", "THIS_WEEK", "records request"),
+])
+def test_inflected_keywords_still_match(subject, zone, keyword):
+    result = classify(subject)
+    assert result.zone == zone
+    assert f"'{keyword}'" in result.reason
+
+
+def test_keyword_match_is_case_insensitive():
+    assert classify("URGENT: CALL BACK").zone == "STAT"
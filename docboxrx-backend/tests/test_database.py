@@ -0,0 +1,57 @@
+import asyncio
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import database
+from app.database import LazySession, get_db
+from app.models.state_vector import MessageStateVector
+
+
+def counting_maker(monkeypatch) -> list:
+    opened = []
+    real_maker = database.async_session
+
+    def maker():
+        session = real_maker()
+        opened.append(session)
+        return session
+
+    monkeypatch.setattr(database, "async_session", maker)
+    return opened
+
+
+def test_get_db_skips_session_for_routes_that_never_query(monkeypatch):
+    opened = counting_maker(monkeypatch)
+    app = FastAPI()
+
+    @app.get("/idle")
+    async def idle(db: AsyncSession = Depends(get_db)):
+        return {"ok": True}
+
+    @app.get("/query")
+    async def query(db: AsyncSession = Depends(get_db)):
+        return {"value": (await db.execute(text("SELECT 1"))).scalar()}
+
+    client = TestClient(app)
+    assert client.get("/idle").json() == {"ok": True}
+    assert opened == []
+
+    assert client.get("/query").json() == {"value": 1}
+    assert len(opened) == 1
+
+
+def test_lazy_session_forwards_async_with_and_membership():
+    async def run():
+        lazy = LazySession(database.async_session)
+        async with lazy as session:
+            assert session is lazy
+            assert (await session.execute(text("SELECT 2"))).scalar() == 2
+            assert MessageStateVector() not in lazy
+            assert list(lazy) == []
+        assert isinstance(lazy.session, AsyncSession)
+        await lazy.close()
+
+    asyncio.run(run())
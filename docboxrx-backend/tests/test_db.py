@@ -0,0 +1,200 @@
+import base64
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+
+
+def make_grant(user_id: str, **fields) -> dict:
+    grant = {
+        "user_id": user_id,
+        "grant_id": f"g-{uuid.uuid4().hex}",
+        "email": "doctor@example.com",
+        "provider": "google",
+        "access_token": "access-1",
+        "refresh_token": "refresh-1",
+    }
+    grant.update(fields)
+    return db.create_nylas_grant(grant)
+
+
+def make_message(user_id: str, **fields) -> dict:
+    message = {
+        "id": f"m-{uuid.uuid4().hex}",
+        "user_id": user_id,
+        "sender": "Lab <results@example.com>",
+        "sender_domain": "example.com",
+        "subject": "Results",
+        "snippet": "",
+        "zone": "LATER",
+        "confidence": 0.9,
+        "reason": "test",
+        "jone5_message": "test",
+        "received_at": "2026-01-01T00:00:00",
+        "classified_at": datetime.utcnow().isoformat(),
+    }
+    message.update(fields)
+    return message
+
+
+@pytest.fixture
+def sync_buffer(monkeypatch):
+    # Pretend the flusher thread is running so flushes only happen when a test calls them
+    monkeypatch.setattr(db, "_sync_flusher", object())
+    db.flush_sync_times()
+    yield db._pending_sync_times
+    db._pending_sync_times.clear()
+
+
+def test_sync_time_is_buffered_then_flushed(user, sync_buffer):
+    grant = make_grant(user["id"])
+    db.update_nylas_grant_sync_time(grant["grant_id"], "2026-01-02T03:04:05")
+    assert sync_buffer[grant["grant_id"]] == ("2026-01-02T03:04:05", 0)
+
+    db.flush_sync_times()
+    assert not sync_buffer
+    assert str(db.get_nylas_grant_by_grant_id(grant["grant_id"])["last_sync_at"]).startswith("2026-01-02")
+
+
+def test_sync_time_is_normalized_to_naive_utc(user, sync_buffer):
+    grant = make_grant(user["id"])
+    db.update_nylas_grant_sync_time(grant["grant_id"], "2026-01-02T05:04:05+02:00")
+    assert sync_buffer[grant["grant_id"]][0] == "2026-01-02T03:04:05"
+
+
+def test_sync_time_none_is_not_stringified(user, sync_buffer):
+    grant = make_grant(user["id"], last_sync_at="2026-01-01T00:00:00")
+    db.update_nylas_grant_sync_time(grant["grant_id"], None)
+    db.flush_sync_times()
+    assert db.get_nylas_grant_by_grant_id(grant["grant_id"])["last_sync_at"] is None
+
+
+@pytest.mark.parametrize("value", ["not a date", "None", 12345])
+def test_sync_time_rejects_non_timestamps(sync_buffer, value):
+    with pytest.raises(ValueError):
+        db.update_nylas_grant_sync_time("g-any", value)
+    assert not sync_buffer
+
+
+def test_sync_flush_isolates_a_failing_row(user, sync_buffer, monkeypatch):
+    good = make_grant(user["id"])
+    real_update = db.update_nylas_grant_sync_times
+
+    def update(sync_times):
+        if any(grant_id == "g-broken" for grant_id, _ in sync_times):
+            raise RuntimeError("boom")
+        real_update(sync_times)
+
+    monkeypatch.setattr(db, "update_nylas_grant_sync_times", update)
+    db.update_nylas_grant_sync_time(good["grant_id"], "2026-03-01T00:00:00")
+    db.update_nylas_grant_sync_time("g-broken", "2026-03-01T00:00:00")
+
+    db.flush_sync_times()
+    # The good row is written despite the failing one, which waits for another try
+    assert str(db.get_nylas_grant_by_grant_id(good["grant_id"])["last_sync_at"]).startswith("2026-03-01")
+    assert sync_buffer == {"g-broken": ("2026-03-01T00:00:00", 1)}
+
+    # ...and is dropped once it has failed _SYNC_FLUSH_MAX_ATTEMPTS times
+    for _ in range(db._SYNC_FLUSH_MAX_ATTEMPTS - 1):
+        db.flush_sync_times()
+    assert not sync_buffer
+
+
+def test_token_round_trip():
+    encrypted = db.encrypt_token("secret-token")
+    assert encrypted.startswith(db._TOKEN_PREFIX) and "secret-token" not in encrypted
+    assert db.decrypt_token(encrypted) == "secret-token"
+    # Fresh nonce per call
+    assert db.encrypt_token("secret-token") != encrypted
+
+
+@pytest.mark.parametrize("token", ["old-token", "x" * (db._TOKEN_KEY_TILED_BYTES + 5)])
+def test_decrypt_token_reads_legacy_xor_values(token):
+    # Encrypted the way tokens were stored before AES-GCM: byte-wise XOR with the repeating key
+    key = db._token_key
+    legacy_bytes = bytes(b ^ key[i % len(key)] for i, b in enumerate(token.encode("utf-8")))
+    assert db._xor_cipher(legacy_bytes) == token.encode("utf-8")
+    assert db.decrypt_token(base64.urlsafe_b64encode(legacy_bytes).decode("utf-8")) == token
+
+
+@pytest.mark.parametrize("value", [None, "", "v1:not-base64!", db._TOKEN_PREFIX + "AAAA"])
+def test_decrypt_token_returns_none_for_missing_or_bad_values(value):
+    assert db.decrypt_token(value) is None
+
+
+def test_create_nylas_grant_upserts_on_grant_id(user):
+    first = make_grant(user["id"], access_token="access-1")
+    second = make_grant(user["id"], grant_id=first["grant_id"], email="new@example.com", access_token="access-2")
+
+    assert second["id"] == first["id"]
+    assert second["email"] == "new@example.com"
+    assert "access_token" not in second
+    assert len(db.get_nylas_grants_by_user(user["id"])) == 1
+    assert db.get_nylas_grant_credentials(first["grant_id"])["access_token"] == "access-2"
+
+
+def test_bulk_create_messages_round_trip(user):
+    messages = [
+        make_message(user["id"], received_at=f"2026-01-01T00:00:{i:02d}", provider_folders=["INBOX"], attachments=[{"id": i}])
+        for i in range(3)
+    ]
+    assert db.bulk_create_messages(messages) == 3
+    assert db.bulk_create_messages([]) == 0
+
+    stored = db.get_messages_by_user(user["id"])
+    assert [m["id"] for m in stored] == [m["id"] for m in reversed(messages)]
+    assert stored[0]["provider_folders"] == ["INBOX"]
+
+
+def test_messages_keyset_pagination(user):
+    db.bulk_create_messages([
+        make_message(user["id"], received_at=f"2026-01-01T00:00:{i:02d}") for i in range(5)
+    ])
+    first_page = db.get_messages_by_user(user["id"], limit=2)
+    second_page = db.get_messages_by_user(user["id"], limit=2, before_received_at=first_page[-1]["received_at"])
+    last_page = db.get_messages_by_user(user["id"], limit=2, before_received_at=second_page[-1]["received_at"])
+
+    received = [m["received_at"] for m in first_page + second_page + last_page]
+    assert len(set(received)) == 5
+    assert received == sorted(received, reverse=True)
+
+
+def test_update_message_status_returns_the_updated_row(user):
+    message = db.create_message(make_message(user["id"]))
+    updated = db.update_message_status(message["id"], user["id"], "snoozed", "2026-02-01T00:00:00")
+    assert updated == {"id": message["id"], "status": "snoozed", "snoozed_until": "2026-02-01T00:00:00"}
+    # An empty snooze is stored as NULL
+    assert db.update_message_status(message["id"], user["id"], "active", "")["snoozed_until"] is None
+
+
+def test_update_message_status_missing_message(user):
+    assert db.update_message_status("m-missing", user["id"], "done") is None
+    message = db.create_message(make_message(user["id"]))
+    assert db.update_message_status(message["id"], "someone-else", "done") is None
+
+
+def test_action_items_split_into_buckets(user):
+    now = datetime.utcnow()
+    stat = make_message(user["id"], zone="STAT")
+    today = make_message(user["id"], zone="TODAY", received_at="2026-01-02T00:00:00")
+    reply = make_message(user["id"], zone="LATER", action_type="reply")
+    snoozed = make_message(user["id"])
+    done = make_message(user["id"], zone="STAT")
+    db.bulk_create_messages([stat, today, reply, snoozed, done])
+    db.update_message_status(snoozed["id"], user["id"], "snoozed", (now - timedelta(hours=1)).isoformat())
+    db.update_message_status(done["id"], user["id"], "done")
+
+    items = db.get_action_items(user["id"])
+    # STAT before TODAY even though the TODAY message is newer
+    assert [m["id"] for m in items["urgent_items"]] == [stat["id"], today["id"]]
+    assert [m["id"] for m in items["needs_reply"]] == [reply["id"]]
+    assert [m["id"] for m in items["snoozed_due"]] == [snoozed["id"]]
+    assert items["done_today"] == 1
+    assert items["total_action_items"] == 3
+    assert "bucket_rank" not in items["urgent_items"][0]
+
+    db.update_message_status(reply["id"], user["id"], "snoozed", (now + timedelta(days=1)).isoformat())
+    items = db.get_action_items(user["id"])
+    assert items["needs_reply"] == [] and len(items["snoozed_due"]) == 1
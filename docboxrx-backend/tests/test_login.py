@@ -1,4 +1,6 @@
+import bcrypt
 import pytest
+from app import db
 from app.main import app
 from fastapi.testclient import TestClient
 
@@ -11,4 +13,16 @@ def test_login():
 
 def test_login_failure():
     response = client.post("/api/auth/login", json={"email": "wronguser@example.com", "password": "wrongpass"})
-    assert response.status_code == 401
\ No newline at end of file
+    assert response.status_code == 401
+
+def test_login_rehashes_legacy_bcrypt_password(user):
+    legacy = bcrypt.hashpw(b"legacy-pass", bcrypt.gensalt(rounds=4)).decode("utf-8")
+    db.update_user_password_hash(user["id"], legacy)
+
+    response = client.post("/api/auth/login", json={"email": user["email"], "password": "legacy-pass"})
+    assert response.status_code == 200
+    rehashed = db.get_user_by_email(user["email"])["hashed_password"]
+    assert rehashed.startswith("$argon2")
+    # The upgraded hash still accepts the same password
+    response = client.post("/api/auth/login", json={"email": user["email"], "password": "legacy-pass"})
+    assert response.status_code == 200